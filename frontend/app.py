@@ -1,7 +1,20 @@
+import csv
+import hashlib
+import io
+import logging
+import threading
+import time
+import uuid
+
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2 import pool
+from psycopg2.extras import RealDictCursor, execute_batch, execute_values
 import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
 from dotenv import load_dotenv
 import bcrypt
 
@@ -16,19 +29,49 @@ except Exception:
 # Localmente, ela será lida do .env
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Fator de custo do bcrypt. O padrão (12) é adequado para produção; em
+# desenvolvimento/CI pode-se reduzir via variável de ambiente (cada decremento
+# corta o tempo de hash pela metade).
+BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", "12"))
+
+# Em produção o traceback completo não é renderizado na página (caro de
+# formatar e expõe detalhes do schema); fica só no log do servidor.
+DEBUG = os.getenv("APP_DEBUG") == "1"
+
+logger = logging.getLogger(__name__)
+
 
-# Função que tenta estabelecer uma nova conexão (sem cache)
-# st.cache_resource gerencia o ciclo de vida da conexão para Streamlit
+# O tipo C de conexão do psycopg2 não aceita atributos de instância; esta
+# subclasse Python ganha um __dict__ e passa a carregar o conjunto de
+# statements já preparados na sessão (ver _execute_prepared).
+class TrackedConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+# Pool de conexões compartilhado entre as sessões do Streamlit.
+# st.cache_resource garante que o pool seja criado uma única vez por processo,
+# evitando o handshake TLS+autenticação do Postgres a cada operação.
 @st.cache_resource
-def get_db_connection():
+def get_db_pool():
     if not DATABASE_URL:
         st.error(
             "Variável de ambiente DATABASE_URL não configurada. Verifique os Secrets do Streamlit Cloud ou seu arquivo .env."
         )
         st.stop()
     try:
-        # Retorna a conexão, o cache_resource a manterá aberta e reutilizável
-        return psycopg2.connect(DATABASE_URL)
+        # plan_cache_mode=force_custom_plan: como os statements quentes são
+        # preparados por conexão (PREPARED_STATEMENTS), o Postgres trocaria
+        # para um plano genérico após 5 execuções — ruim quando a seletividade
+        # do parâmetro varia (ex.: project_id com cardinalidades díspares).
+        return pool.ThreadedConnectionPool(
+            minconn=2,
+            maxconn=20,
+            dsn=DATABASE_URL,
+            connection_factory=TrackedConnection,
+            options="-c plan_cache_mode=force_custom_plan",
+        )
     except Exception as e:
         st.error(
             f"Erro ao conectar ao banco de dados: {e}. Verifique a string de conexão."
@@ -37,6 +80,51 @@ def get_db_connection():
     return None
 
 
+# Context manager que empresta uma conexão do pool e a devolve ao final,
+# inclusive em caminhos de exceção (putconn no finally).
+# autocommit=True dispensa o COMMIT explícito (um round-trip a menos) em
+# operações de um único statement; o padrão continua transacional.
+@contextmanager
+def get_db_connection(autocommit=False):
+    db_pool = get_db_pool()
+    conn = db_pool.getconn()
+    try:
+        conn.autocommit = autocommit
+        yield conn
+    finally:
+        # Se a conexão morreu no meio da operação (ex.: autosuspend/idle
+        # disconnect do Neon), mexer em autocommit levantaria InterfaceError
+        # e a conexão nunca voltaria ao pool; putconn lida com conexões
+        # fechadas/quebradas por conta própria.
+        try:
+            if not conn.closed:
+                conn.autocommit = False
+        finally:
+            db_pool.putconn(conn)
+
+
+# Context manager de mais alto nível para os handlers que gerenciavam conexão
+# e cursor manualmente: abre o cursor, faz commit no sucesso e rollback em
+# exceção, e fecha o cursor em qualquer caminho. Com autocommit=True não há
+# transação a concluir (statements únicos).
+@contextmanager
+def db_cursor(dict_cursor=False, autocommit=False):
+    with get_db_connection(autocommit=autocommit) as conn:
+        cur = conn.cursor(cursor_factory=RealDictCursor if dict_cursor else None)
+        try:
+            yield cur
+            if not autocommit:
+                conn.commit()
+        except Exception:
+            # Conexão morta não tem o que reverter; o rollback levantaria
+            # InterfaceError e esconderia a exceção original.
+            if not autocommit and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+
 # --- Funções de Manipulação do Banco de Dados (CRUD para todas as tabelas) ---
 # Função auxiliar para executar operações de BD com gerenciamento de transação e conexão
 def execute_db_operation(operation_func, *args, **kwargs):
@@ -46,30 +134,47 @@ def execute_db_operation(operation_func, *args, **kwargs):
     sejam gerenciados e fechados corretamente, e que as transações
     (commit/rollback) sejam tratadas automaticamente.
     """
-    conn = get_db_connection()  # Obtém a conexão do cache
-    if conn is None:
-        return {"error": "Sem conexão com o banco de dados."}
-
     try:
         # O 'with' statement para a conexão garante que conn.commit() ou conn.rollback()
-        # sejam chamados automaticamente ao sair do bloco, e a conexão é gerenciada.
-        # Para st.cache_resource, a conexão não é fechada, mas a transação é concluída.
-        with conn:  # Usa a conexão como um context manager
-            with conn.cursor() as cur:  # O cursor também é um context manager
-                result = operation_func(cur, *args, **kwargs)
-                return result
+        # sejam chamados automaticamente ao sair do bloco, e a conexão
+        # volta para o pool ao final da operação.
+        with get_db_connection() as conn:
+            with conn:  # Usa a conexão como um context manager (transação)
+                with conn.cursor() as cur:  # O cursor também é um context manager
+                    result = operation_func(cur, *args, **kwargs)
+                    return result
     except psycopg2.Error as e:
         st.error(f"Erro no banco de dados: {e}")
-        st.exception(e)  # Para depuração detalhada no Streamlit Cloud
+        logger.exception("Falha em operação de banco de dados")
+        if DEBUG:
+            st.exception(e)  # Para depuração detalhada no Streamlit Cloud
         return {"error": str(e)}
     except Exception as e:
         st.error(
             f"Ocorreu um erro inesperado durante a operação de banco de dados: {e}"
         )
-        st.exception(e)
+        logger.exception("Falha inesperada em operação de banco de dados")
+        if DEBUG:
+            st.exception(e)
         return {"error": str(e)}
 
 
+# Itera sobre resultados grandes usando um cursor nomeado (server-side).
+# As linhas chegam do servidor em lotes de `itersize`, sem materializar a
+# tabela inteira em memória como fetchall(). Indicado para telas de
+# exportação/relatório que percorrem diários de obra ou fotos em volume.
+def iter_query(sql, params=(), itersize=500):
+    with get_db_connection() as conn:
+        with conn:
+            with conn.cursor(
+                name="stream_query", cursor_factory=RealDictCursor
+            ) as cur:
+                cur.itersize = itersize
+                cur.execute(sql, params)
+                for row in cur:
+                    yield row
+
+
 # Função para criar tabelas (executada na inicialização do app)
 def _create_tables_if_not_exists(cur):
     """
@@ -235,49 +340,481 @@ def _create_tables_if_not_exists(cur):
             FOREIGN KEY (team_member_id) REFERENCES team_members(id) ON DELETE CASCADE,
             assigned_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
         );
+        ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS last_login_attempt TIMESTAMP WITH TIME ZONE;
+        CREATE INDEX IF NOT EXISTS ix_projects_client_id
+            ON projects (client_id);
+        CREATE INDEX IF NOT EXISTS ix_projects_name_covering
+            ON projects (name, id)
+            INCLUDE (client_id, start_date, end_date, status, budget);
+        CREATE INDEX IF NOT EXISTS ix_project_services_project_id
+            ON project_services (project_id);
+        CREATE INDEX IF NOT EXISTS ix_project_documents_project_name
+            ON project_documents (project_id, name);
+        CREATE INDEX IF NOT EXISTS ix_document_versions_doc_version
+            ON document_versions (document_id, version_number DESC);
+        CREATE INDEX IF NOT EXISTS ix_daily_logs_project_date
+            ON daily_logs (project_id, log_date DESC);
+        CREATE INDEX IF NOT EXISTS ix_daily_log_activities_log_created
+            ON daily_log_activities (daily_log_id, created_at DESC);
+        CREATE INDEX IF NOT EXISTS ix_daily_log_costs_log_created
+            ON daily_log_costs (daily_log_id, created_at DESC);
+        CREATE INDEX IF NOT EXISTS ix_daily_log_photos_log_date
+            ON daily_log_photos (daily_log_id, upload_date DESC);
+        CREATE INDEX IF NOT EXISTS ix_project_team_members_member
+            ON project_team_members (team_member_id);
+        CREATE OR REPLACE VIEW projects_v AS
+            SELECT p.*, c.name AS client_name
+            FROM projects p
+            JOIN clients c ON p.client_id = c.id;
     """)
-    st.success("Tabelas verificadas/criadas com sucesso!")  # Mensagem de sucesso
 
 
+# st.cache_resource faz o DDL rodar uma única vez por processo, em vez de a
+# cada rerun do script (todo clique/interação reexecuta o módulo inteiro).
+@st.cache_resource
 def create_tables_if_not_exists_wrapper():
-    execute_db_operation(_create_tables_if_not_exists)
+    # Se o DDL falhar (banco indisponível na primeira execução), levanta em
+    # vez de retornar: st.cache_resource não memoriza chamadas com exceção,
+    # então o próximo rerun tenta o bootstrap de novo em vez de fixar um
+    # "sucesso" sem schema pelo tempo de vida do processo.
+    result = execute_db_operation(_create_tables_if_not_exists)
+    if isinstance(result, dict) and "error" in result:
+        raise RuntimeError(f"Falha ao criar/verificar tabelas: {result['error']}")
+    return True
 
 
 # Chamar a função para criar tabelas (será executada na inicialização do app)
 create_tables_if_not_exists_wrapper()
 
 
-# --- AUTENTICAÇÃO ---
-def register_user_db(cur, name, email, password, role="Usuário"):
-    hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode(
-        "utf-8"
+# --- Colunas por tabela e templates de INSERT/UPDATE montados uma única vez ---
+# O SQL de UPDATE é fixo por tabela: COALESCE mantém o valor atual das colunas
+# omitidas, o plano fica cacheável no servidor e nenhum nome de coluna vindo
+# do chamador é concatenado no SQL. Chaves fora da lista são rejeitadas.
+SUPPLIER_COLS = (
+    "name",
+    "cnpj_cpf",
+    "contact",
+    "address",
+    "notes",
+    "delivery_time",
+    "payment_terms",
+)
+COST_CATEGORY_COLS = ("name", "description")
+UNIT_OF_MEASURE_COLS = ("name",)
+CLIENT_COLS = ("name", "contact", "cnpj", "address", "notes")
+TEAM_MEMBER_COLS = (
+    "name",
+    "role",
+    "email",
+    "phone",
+    "cpf",
+    "hiring_date",
+    "access_level",
+    "notes",
+)
+PROJECT_COLS = (
+    "name",
+    "client_id",
+    "address",
+    "start_date",
+    "end_date",
+    "status",
+    "budget",
+)
+PROJECT_SERVICE_COLS = (
+    "name",
+    "duration",
+    "start_date",
+    "end_date",
+    "progress",
+    "cost",
+    "unit",
+    "measure",
+)
+
+
+def _build_update_sql(table, cols):
+    assignments = ", ".join(f"{c} = COALESCE(%s, {c})" for c in cols)
+    return f"UPDATE {table} SET {assignments} WHERE id = %s RETURNING *;"
+
+
+UPDATE_SUPPLIER_SQL = _build_update_sql("suppliers", SUPPLIER_COLS)
+UPDATE_COST_CATEGORY_SQL = _build_update_sql("cost_categories", COST_CATEGORY_COLS)
+UPDATE_UNIT_OF_MEASURE_SQL = _build_update_sql("units_of_measure", UNIT_OF_MEASURE_COLS)
+UPDATE_CLIENT_SQL = _build_update_sql("clients", CLIENT_COLS)
+UPDATE_TEAM_MEMBER_SQL = _build_update_sql("team_members", TEAM_MEMBER_COLS)
+UPDATE_PROJECT_SQL = _build_update_sql("projects", PROJECT_COLS)
+UPDATE_PROJECT_SERVICE_SQL = _build_update_sql("project_services", PROJECT_SERVICE_COLS)
+
+
+# Projeções explícitas para as listagens: evitam SELECT * (menos bytes do
+# banco e nenhuma coluna que a interface não usa, como created_at).
+SUPPLIER_LIST_COLS = ("id",) + SUPPLIER_COLS
+COST_CATEGORY_LIST_COLS = ("id",) + COST_CATEGORY_COLS
+UNIT_OF_MEASURE_LIST_COLS = ("id",) + UNIT_OF_MEASURE_COLS
+CLIENT_LIST_COLS = ("id",) + CLIENT_COLS
+TEAM_MEMBER_LIST_COLS = ("id",) + TEAM_MEMBER_COLS
+PROJECT_SERVICE_LIST_COLS = ("id", "project_id") + PROJECT_SERVICE_COLS
+# A grade de projetos não mostra o endereço completo; o detalhe continua
+# buscando SELECT * em get_project_db.
+PROJECT_LIST_COLS = (
+    "id",
+    "name",
+    "client_id",
+    "client_name",
+    "start_date",
+    "end_date",
+    "status",
+    "budget",
+)
+
+
+def _rows_as_dicts(cur):
+    """
+    Converte as tuplas do cursor padrão em dicts lendo os nomes das colunas
+    uma única vez de cur.description — mais leve que um RealDictCursor, que
+    refaz esse trabalho linha a linha.
+    """
+    names = [d.name for d in cur.description]
+    return [dict(zip(names, row)) for row in cur.fetchall()]
+
+
+def _fetch_list_page(cur, table, cols, after=None, limit=None, extra_where=None, params=()):
+    """
+    Busca uma página de uma listagem ordenada por (name, id) com paginação
+    keyset: `after` é a tupla (name, id) da última linha da página anterior,
+    e `limit` limita o tamanho da página. Sem os dois, o comportamento
+    continua sendo a listagem completa.
+    """
+    sql = f"SELECT {', '.join(cols)} FROM {table}"
+    conditions = []
+    values = list(params)
+    if extra_where:
+        conditions.append(extra_where)
+    if after is not None:
+        conditions.append("(name, id) > (%s, %s)")
+        values.extend(after)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY name, id"
+    if limit is not None:
+        sql += " LIMIT %s"
+        values.append(limit)
+    cur.execute(sql + ";", values)
+    return _rows_as_dicts(cur)
+
+
+def _update_by_id(cur, sql, cols, id, updates):
+    """
+    Executa o template de UPDATE de uma tabela validando as chaves recebidas.
+    Retorna um dict de erro, ou a linha retornada por RETURNING (pode ser None).
+    """
+    if not updates:
+        return {"error": "Nenhum dado fornecido para atualização."}
+    invalid = set(updates) - set(cols)
+    if invalid:
+        return {
+            "error": f"Colunas inválidas para atualização: {', '.join(sorted(invalid))}"
+        }
+    values = [updates.get(c) for c in cols] + [id]
+    cur.execute(sql, values)
+    rows = _rows_as_dicts(cur)
+    return rows[0] if rows else None
+
+
+def _bulk_update_by_ids(cur, sql, cols, edits):
+    """
+    Aplica várias edições de uma vez (lista de dicts com 'id' + colunas
+    alteradas) reutilizando o mesmo template COALESCE do _update_by_id.
+    execute_batch agrupa os UPDATEs em poucas idas ao servidor, em vez de
+    um round-trip por linha editada.
+    """
+    if not edits:
+        return {"error": "Nenhum dado fornecido para atualização."}
+    params = []
+    for edit in edits:
+        if "id" not in edit:
+            return {"error": "Cada edição precisa conter a chave 'id'."}
+        invalid = set(edit) - set(cols) - {"id"}
+        if invalid:
+            return {
+                "error": f"Colunas inválidas para atualização: {', '.join(sorted(invalid))}"
+            }
+        params.append([edit.get(c) for c in cols] + [edit["id"]])
+    execute_batch(cur, sql, params, page_size=100)
+    return {"message": f"{len(params)} registros atualizados com sucesso"}
+
+
+# Colunas atualizáveis das tabelas com UPDATE dinâmico (documentos, versões e
+# filhas do RDO). Diferente dos templates COALESCE acima, aqui o SET só inclui
+# as chaves realmente enviadas; o SQL de cada combinação de chaves é montado
+# uma única vez (lru_cache) e chaves fora da lista são rejeitadas.
+ALLOWED_UPDATE_COLS = {
+    "project_documents": (
+        "name",
+        "type",
+        "file_url",
+        "size_kb",
+        "upload_date",
+        "uploaded_by",
+        "notes",
+    ),
+    "document_versions": (
+        "version_number",
+        "file_url",
+        "upload_date",
+        "uploaded_by",
+        "notes",
+    ),
+    "daily_logs": (
+        "log_date",
+        "weather",
+        "personnel",
+        "notes",
+        "materials_received",
+        "equipment_used",
+        "occurrences",
+        "location_lat",
+        "location_lon",
+    ),
+    "daily_log_activities": (
+        "step_name",
+        "activity_type",
+        "quantity",
+        "unit",
+        "observations",
+    ),
+    "daily_log_costs": ("description", "value", "category", "associated_step"),
+    "daily_log_photos": ("photo_url", "description", "upload_date", "uploaded_by"),
+}
+
+
+@lru_cache(maxsize=256)
+def _build_partial_update_sql(table, keys):
+    assignments = ", ".join(f"{k} = %s" for k in keys)
+    return f"UPDATE {table} SET {assignments} WHERE id = %s RETURNING *;"
+
+
+def _partial_update_by_id(cur, table, id, updates):
+    """
+    Executa um UPDATE dinâmico validado pela lista de colunas da tabela.
+    Retorna um dict de erro, ou a linha do RETURNING (pode ser None).
+    """
+    if not updates:
+        return {"error": "Nenhum dado fornecido para atualização."}
+    allowed = ALLOWED_UPDATE_COLS[table]
+    invalid = set(updates) - set(allowed)
+    if invalid:
+        return {
+            "error": f"Colunas inválidas para atualização: {', '.join(sorted(invalid))}"
+        }
+    keys = tuple(k for k in allowed if k in updates)  # ordem canônica p/ o cache
+    values = [updates[k] for k in keys] + [id]
+    cur.execute(_build_partial_update_sql(table, keys), values)
+    rows = _rows_as_dicts(cur)
+    return rows[0] if rows else None
+
+
+# Projeções explícitas das listagens de documentos e do RDO (id + chave
+# estrangeira + colunas editáveis), pelo mesmo motivo das *_LIST_COLS acima.
+PROJECT_DOCUMENT_LIST_COLS = ("id", "project_id") + ALLOWED_UPDATE_COLS[
+    "project_documents"
+]
+DOCUMENT_VERSION_LIST_COLS = ("id", "document_id") + ALLOWED_UPDATE_COLS[
+    "document_versions"
+]
+DAILY_LOG_LIST_COLS = ("id", "project_id") + ALLOWED_UPDATE_COLS["daily_logs"]
+DAILY_LOG_ACTIVITY_LIST_COLS = (
+    ("id", "daily_log_id") + ALLOWED_UPDATE_COLS["daily_log_activities"] + ("created_at",)
+)
+DAILY_LOG_COST_LIST_COLS = (
+    ("id", "daily_log_id") + ALLOWED_UPDATE_COLS["daily_log_costs"] + ("created_at",)
+)
+DAILY_LOG_PHOTO_LIST_COLS = ("id", "daily_log_id") + ALLOWED_UPDATE_COLS[
+    "daily_log_photos"
+]
+PROJECT_TEAM_MEMBER_LIST_COLS = ("project_id", "team_member_id", "assigned_at")
+
+
+def _fetch_desc_page(
+    cur, table, cols, order_col, filter_col=None, filter_value=None, after=None, limit=None
+):
+    """
+    Página de uma listagem em ordem decrescente de (order_col, id). `after` é
+    a tupla (order_col, id) da última linha da página anterior (keyset), e
+    `limit` limita o tamanho da página; sem os dois, retorna a lista completa.
+    """
+    sql = f"SELECT {', '.join(cols)} FROM {table}"
+    conditions = []
+    values = []
+    if filter_value:
+        conditions.append(f"{filter_col} = %s")
+        values.append(filter_value)
+    if after is not None:
+        conditions.append(f"({order_col}, id) < (%s, %s)")
+        values.extend(after)
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += f" ORDER BY {order_col} DESC, id DESC"
+    if limit is not None:
+        sql += " LIMIT %s"
+        values.append(limit)
+    cur.execute(sql + ";", values)
+    return cur.fetchall()
+
+
+# Statements preparados no servidor para os caminhos quentes de linha única.
+# O PREPARE roda uma vez por conexão do pool, na primeira utilização de cada
+# statement; os EXECUTEs seguintes pulam o parse/plan no servidor. O preparo é
+# preguiçoso (e não no checkout da conexão) para não depender das tabelas já
+# existirem quando o DDL inicial ainda vai rodar.
+PREPARED_STATEMENTS = {
+    f"delete_{table}_by_id": f"DELETE FROM {table} WHERE id = $1 RETURNING id"
+    for table in (
+        "suppliers",
+        "cost_categories",
+        "units_of_measure",
+        "clients",
+        "team_members",
+        "projects",
+        "project_services",
+        "project_documents",
+        "document_versions",
+        "daily_logs",
+        "daily_log_activities",
+        "daily_log_costs",
+        "daily_log_photos",
     )
+}
+
+
+def _build_prepared_insert(table, cols):
+    placeholders = ", ".join(f"${i + 1}" for i in range(len(cols)))
+    return (
+        f"INSERT INTO {table} ({', '.join(cols)}) "
+        f"VALUES ({placeholders}) RETURNING id"
+    )
+
+
+# Os INSERTs unitários das telas de cadastro também são preparados, pelo
+# mesmo mecanismo preguiçoso dos DELETEs acima.
+PREPARED_STATEMENTS.update(
+    {
+        "insert_suppliers": _build_prepared_insert("suppliers", SUPPLIER_COLS),
+        "insert_cost_categories": _build_prepared_insert(
+            "cost_categories", COST_CATEGORY_COLS
+        ),
+        "insert_units_of_measure": _build_prepared_insert(
+            "units_of_measure", UNIT_OF_MEASURE_COLS
+        ),
+        "insert_clients": _build_prepared_insert("clients", CLIENT_COLS),
+        "insert_team_members": _build_prepared_insert(
+            "team_members", TEAM_MEMBER_COLS
+        ),
+        "insert_projects": _build_prepared_insert("projects", PROJECT_COLS),
+        "insert_project_services": _build_prepared_insert(
+            "project_services", ("project_id",) + PROJECT_SERVICE_COLS
+        ),
+    }
+)
+
+
+def _execute_prepared(cur, name, params):
+    # O conjunto vive na TrackedConnection (subclasse usada pelo pool) e
+    # acompanha a sessão do servidor: statements preparados sobrevivem a
+    # rollback (são estado de sessão, não de transação) e só somem quando a
+    # conexão fecha — momento em que o pool cria outra com o conjunto vazio.
+    prepared = cur.connection.prepared_statements
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {PREPARED_STATEMENTS[name]};")
+        prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders});", params)
+
+
+# --- AUTENTICAÇÃO ---
+# O bcrypt é intencionalmente lento (~100ms por hash). As funções abaixo
+# calculam/verificam o hash FORA de execute_db_operation, para que nenhuma
+# conexão do pool fique emprestada (nem transação aberta) enquanto a CPU
+# trabalha no hash.
+def register_user_db(cur, name, email, password_hash, role="Usuário"):
     cur.execute(
         """INSERT INTO users (email, password_hash, name, role)
            VALUES (%s, %s, %s, %s) RETURNING id;""",
-        (email, hashed_password, name, role),
+        (email, password_hash, name, role),
     )
     user_id = cur.fetchone()[0]
     return {"message": "Usuário registrado com sucesso", "id": str(user_id)}
 
 
-def login_user_db(cur, email, password):
+def register_user(name, email, password, role="Usuário"):
+    hashed_password = bcrypt.hashpw(
+        password.encode("utf-8"), bcrypt.gensalt(rounds=BCRYPT_LOG_ROUNDS)
+    ).decode("utf-8")
+    return execute_db_operation(register_user_db, name, email, hashed_password, role)
+
+
+def get_user_for_login_db(cur, email):
+    # Um único round-trip: lê o usuário e, no mesmo statement, registra o
+    # horário da tentativa de login em last_login_attempt.
     cur.execute(
-        "SELECT id, email, password_hash, name, role FROM users WHERE email = %s;",
+        """WITH sel AS (
+               SELECT id, email, password_hash, name, role
+               FROM users WHERE email = %s
+           ), upd AS (
+               UPDATE users SET last_login_attempt = now()
+               WHERE id IN (SELECT id FROM sel)
+           )
+           SELECT * FROM sel;""",
         (email,),
     )
-    user = cur.fetchone()
-    if user and bcrypt.checkpw(
-        password.encode("utf-8"), user["password_hash"].encode("utf-8")
-    ):
+    return cur.fetchone()
+
+
+# Hash de referência usado para igualar o tempo de resposta do login quando o
+# email não existe: sem ele, a resposta rápida do caminho "usuário não
+# encontrado" funcionaria como oráculo de enumeração de emails.
+# st.cache_resource evita recalcular o hash a cada rerun do script.
+@st.cache_resource
+def get_dummy_password_hash():
+    return bcrypt.hashpw(
+        b"senha-invalida", bcrypt.gensalt(rounds=BCRYPT_LOG_ROUNDS)
+    ).decode("utf-8")
+
+
+def login_user(email, password):
+    # Cache negativo curto, por sessão: reruns em sequência com as mesmas
+    # credenciais reprovadas devolvem o erro direto, sem repetir o
+    # round-trip ao banco nem a verificação bcrypt (~100ms de CPU).
+    attempt_key = hashlib.sha256(f"{email}\x00{password}".encode("utf-8")).hexdigest()
+    last_failed = st.session_state.get("_last_failed_login")
+    if last_failed and last_failed[0] == attempt_key and time.time() - last_failed[1] < 2:
+        return {"error": "Email ou senha inválidos."}
+    user = execute_db_operation(get_user_for_login_db, email)
+    if isinstance(user, dict) and "error" in user:
+        return user
+    stored_hash = user[2] if user else get_dummy_password_hash()
+    password_ok = bcrypt.checkpw(password.encode("utf-8"), stored_hash.encode("utf-8"))
+    if user and password_ok:
         return {
             "message": "Login bem-sucedido",
-            "user_id": str(user["id"]),
-            "user_name": user["name"],
-            "user_role": user["role"],
+            "user_id": str(user[0]),
+            "user_name": user[3],
+            "user_role": user[4],
         }
-    else:
-        return {"error": "Email ou senha inválidos."}
+    st.session_state["_last_failed_login"] = (attempt_key, time.time())
+    return {"error": "Email ou senha inválidos."}
+
+
+def current_user():
+    """
+    Contexto do usuário autenticado (id, nome, papel), lido somente de
+    st.session_state — o dado entra na sessão uma única vez no login e
+    nenhuma página precisa reconsultar a tabela users a cada rerun.
+    """
+    return st.session_state.get("user_info") or {}
 
 
 # --- Funções CRUD para Fornecedores ---
@@ -291,45 +828,39 @@ def add_supplier_db(
     delivery_time=None,
     payment_terms=None,
 ):
-    cur.execute(
-        """INSERT INTO suppliers (name, cnpj_cpf, contact, address, notes, delivery_time, payment_terms)
-           VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id;""",
+    _execute_prepared(
+        cur,
+        "insert_suppliers",
         (name, cnpj_cpf, contact, address, notes, delivery_time, payment_terms),
     )
     supplier_id = cur.fetchone()[0]
     return {"message": "Fornecedor adicionado com sucesso", "id": str(supplier_id)}
 
 
-def get_suppliers_db(cur):
-    cur.execute("SELECT * FROM suppliers ORDER BY name;")
-    suppliers = cur.fetchall()
+def get_suppliers_db(cur, after=None, limit=None):
+    suppliers = _fetch_list_page(cur, "suppliers", SUPPLIER_LIST_COLS, after, limit)
     return suppliers
 
 
 def update_supplier_db(cur, id, updates):
-    set_clauses = []
-    values = []
-    for key, value in updates.items():
-        set_clauses.append(f"{key} = %s")
-        values.append(value)
-
-    if not set_clauses:
-        return {"error": "Nenhum dado fornecido para atualização."}
-
-    values.append(id)
-    query = f"UPDATE suppliers SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-    cur.execute(query, values)
-    updated_id = cur.fetchone()
-    if updated_id:
+    row = _update_by_id(cur, UPDATE_SUPPLIER_SQL, SUPPLIER_COLS, id, updates)
+    if isinstance(row, dict) and "error" in row:
+        return row
+    if row:
         return {
             "message": "Fornecedor atualizado com sucesso",
-            "id": str(updated_id[0]),
+            "id": str(row["id"]),
+            "row": row,
         }
     return {"error": "Fornecedor não encontrado."}
 
 
+def bulk_update_suppliers_db(cur, edits):
+    return _bulk_update_by_ids(cur, UPDATE_SUPPLIER_SQL, SUPPLIER_COLS, edits)
+
+
 def delete_supplier_db(cur, id):
-    cur.execute("DELETE FROM suppliers WHERE id = %s RETURNING id;", (id,))
+    _execute_prepared(cur, "delete_suppliers_by_id", (id,))
     deleted_id = cur.fetchone()
     if deleted_id:
         return {"message": "Fornecedor deletado com sucesso", "id": str(deleted_id[0])}
@@ -338,9 +869,9 @@ def delete_supplier_db(cur, id):
 
 # --- Funções CRUD para Categorias de Custo ---
 def add_cost_category_db(cur, name, description=None):
-    cur.execute(
-        """INSERT INTO cost_categories (name, description)
-           VALUES (%s, %s) RETURNING id;""",
+    _execute_prepared(
+        cur,
+        "insert_cost_categories",
         (name, description),
     )
     category_id = cur.fetchone()[0]
@@ -350,36 +881,26 @@ def add_cost_category_db(cur, name, description=None):
     }
 
 
-def get_cost_categories_db(cur):
-    cur.execute("SELECT * FROM cost_categories ORDER BY name;")
-    categories = cur.fetchall()
+def get_cost_categories_db(cur, after=None, limit=None):
+    categories = _fetch_list_page(cur, "cost_categories", COST_CATEGORY_LIST_COLS, after, limit)
     return categories
 
 
 def update_cost_category_db(cur, id, updates):
-    set_clauses = []
-    values = []
-    for key, value in updates.items():
-        set_clauses.append(f"{key} = %s")
-        values.append(value)
-
-    if not set_clauses:
-        return {"error": "Nenhum dado fornecido para atualização."}
-
-    values.append(id)
-    query = f"UPDATE cost_categories SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-    cur.execute(query, values)
-    updated_id = cur.fetchone()
-    if updated_id:
+    row = _update_by_id(cur, UPDATE_COST_CATEGORY_SQL, COST_CATEGORY_COLS, id, updates)
+    if isinstance(row, dict) and "error" in row:
+        return row
+    if row:
         return {
             "message": "Categoria de custo atualizada com sucesso",
-            "id": str(updated_id[0]),
+            "id": str(row["id"]),
+            "row": row,
         }
     return {"error": "Categoria de custo não encontrada."}
 
 
 def delete_cost_category_db(cur, id):
-    cur.execute("DELETE FROM cost_categories WHERE id = %s RETURNING id;", (id,))
+    _execute_prepared(cur, "delete_cost_categories_by_id", (id,))
     deleted_id = cur.fetchone()
     if deleted_id:
         return {
@@ -391,45 +912,35 @@ def delete_cost_category_db(cur, id):
 
 # --- Funções CRUD para Unidades de Medida ---
 def add_unit_of_measure_db(cur, name):
-    cur.execute(
-        """INSERT INTO units_of_measure (name)
-           VALUES (%s) RETURNING id;""",
+    _execute_prepared(
+        cur,
+        "insert_units_of_measure",
         (name,),
     )
     unit_id = cur.fetchone()[0]
     return {"message": "Unidade de medida adicionada com sucesso", "id": str(unit_id)}
 
 
-def get_units_of_measure_db(cur):
-    cur.execute("SELECT * FROM units_of_measure ORDER BY name;")
-    units = cur.fetchall()
+def get_units_of_measure_db(cur, after=None, limit=None):
+    units = _fetch_list_page(cur, "units_of_measure", UNIT_OF_MEASURE_LIST_COLS, after, limit)
     return units
 
 
 def update_unit_of_measure_db(cur, id, updates):
-    set_clauses = []
-    values = []
-    for key, value in updates.items():
-        set_clauses.append(f"{key} = %s")
-        values.append(value)
-
-    if not set_clauses:
-        return {"error": "Nenhum dado fornecido para atualização."}
-
-    values.append(id)
-    query = f"UPDATE units_of_measure SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-    cur.execute(query, values)
-    updated_id = cur.fetchone()
-    if updated_id:
+    row = _update_by_id(cur, UPDATE_UNIT_OF_MEASURE_SQL, UNIT_OF_MEASURE_COLS, id, updates)
+    if isinstance(row, dict) and "error" in row:
+        return row
+    if row:
         return {
             "message": "Unidade de medida atualizada com sucesso",
-            "id": str(updated_id[0]),
+            "id": str(row["id"]),
+            "row": row,
         }
     return {"error": "Unidade de medida não encontrada."}
 
 
 def delete_unit_of_measure_db(cur, id):
-    cur.execute("DELETE FROM units_of_measure WHERE id = %s RETURNING id;", (id,))
+    _execute_prepared(cur, "delete_units_of_measure_by_id", (id,))
     deleted_id = cur.fetchone()
     if deleted_id:
         return {
@@ -441,42 +952,39 @@ def delete_unit_of_measure_db(cur, id):
 
 # --- Funções CRUD para Clientes ---
 def add_client_db(cur, name, contact=None, cnpj=None, address=None, notes=None):
-    cur.execute(
-        """INSERT INTO clients (name, contact, cnpj, address, notes)
-           VALUES (%s, %s, %s, %s, %s) RETURNING id;""",
+    _execute_prepared(
+        cur,
+        "insert_clients",
         (name, contact, cnpj, address, notes),
     )
     client_id = cur.fetchone()[0]
     return {"message": "Cliente adicionado com sucesso", "id": str(client_id)}
 
 
-def get_clients_db(cur):
-    cur.execute("SELECT * FROM clients ORDER BY name;")
-    clients = cur.fetchall()
+def get_clients_db(cur, after=None, limit=None):
+    clients = _fetch_list_page(cur, "clients", CLIENT_LIST_COLS, after, limit)
     return clients
 
 
 def update_client_db(cur, id, updates):
-    set_clauses = []
-    values = []
-    for key, value in updates.items():
-        set_clauses.append(f"{key} = %s")
-        values.append(value)
+    row = _update_by_id(cur, UPDATE_CLIENT_SQL, CLIENT_COLS, id, updates)
+    if isinstance(row, dict) and "error" in row:
+        return row
+    if row:
+        return {
+            "message": "Cliente atualizado com sucesso",
+            "id": str(row["id"]),
+            "row": row,
+        }
+    return {"error": "Cliente não encontrado."}
 
-    if not set_clauses:
-        return {"error": "Nenhum dado fornecido para atualização."}
 
-    values.append(id)
-    query = f"UPDATE clients SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-    cur.execute(query, values)
-    updated_id = cur.fetchone()
-    if updated_id:
-        return {"message": "Cliente atualizado com sucesso", "id": str(updated_id[0])}
-    return {"error": "Cliente não encontrado."}
+def bulk_update_clients_db(cur, edits):
+    return _bulk_update_by_ids(cur, UPDATE_CLIENT_SQL, CLIENT_COLS, edits)
 
 
 def delete_client_db(cur, id):
-    cur.execute("DELETE FROM clients WHERE id = %s RETURNING id;", (id,))
+    _execute_prepared(cur, "delete_clients_by_id", (id,))
     deleted_id = cur.fetchone()
     if deleted_id:
         return {"message": "Cliente deletado com sucesso", "id": str(deleted_id[0])}
@@ -495,47 +1003,35 @@ def add_team_member_db(
     access_level=None,
     notes=None,
 ):
-    cur.execute(
-        """INSERT INTO team_members (name, role, email, phone, cpf, hiring_date, access_level, notes)
-           VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id;""",
+    _execute_prepared(
+        cur,
+        "insert_team_members",
         (name, role, email, phone, cpf, hiring_date, access_level, notes),
     )
     member_id = cur.fetchone()[0]
     return {"message": "Membro da equipe adicionado com sucesso", "id": str(member_id)}
 
 
-def get_team_members_db(cur):
-    cur.execute("SELECT * FROM team_members ORDER BY name;")
-    members = cur.fetchall()
+def get_team_members_db(cur, after=None, limit=None):
+    members = _fetch_list_page(cur, "team_members", TEAM_MEMBER_LIST_COLS, after, limit)
     return members
 
 
 def update_team_member_db(cur, id, updates):
-    set_clauses = []
-    values = []
-    for key, value in updates.items():
-        set_clauses.append(f"{key} = %s")
-        values.append(value)
-
-    if not set_clauses:
-        return {"error": "Nenhum dado fornecido para atualização."}
-
-    values.append(id)
-    query = (
-        f"UPDATE team_members SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-    )
-    cur.execute(query, values)
-    updated_id = cur.fetchone()
-    if updated_id:
+    row = _update_by_id(cur, UPDATE_TEAM_MEMBER_SQL, TEAM_MEMBER_COLS, id, updates)
+    if isinstance(row, dict) and "error" in row:
+        return row
+    if row:
         return {
             "message": "Membro da equipe atualizado com sucesso",
-            "id": str(updated_id[0]),
+            "id": str(row["id"]),
+            "row": row,
         }
     return {"error": "Membro da equipe não encontrado."}
 
 
 def delete_team_member_db(cur, id):
-    cur.execute("DELETE FROM team_members WHERE id = %s RETURNING id;", (id,))
+    _execute_prepared(cur, "delete_team_members_by_id", (id,))
     deleted_id = cur.fetchone()
     if deleted_id:
         return {
@@ -556,61 +1052,43 @@ def add_project_db(
     status="Em Planejamento",
     budget=None,
 ):
-    cur.execute(
-        """INSERT INTO projects (name, client_id, address, start_date, end_date, status, budget)
-           VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id;""",
+    _execute_prepared(
+        cur,
+        "insert_projects",
         (name, client_id, address, start_date, end_date, status, budget),
     )
     project_id = cur.fetchone()[0]
     return {"message": "Projeto adicionado com sucesso", "id": str(project_id)}
 
 
-def get_projects_db(cur):
-    cur.execute("""
-        SELECT p.*, c.name as client_name
-        FROM projects p
-        JOIN clients c ON p.client_id = c.id
-        ORDER BY p.name;
-    """)
-    projects = cur.fetchall()
+# A view projects_v (criada junto com as tabelas) já projeta client_name,
+# de modo que lista e detalhe compartilham a mesma forma de JOIN no planner.
+def get_projects_db(cur, after=None, limit=None):
+    projects = _fetch_list_page(cur, "projects_v", PROJECT_LIST_COLS, after, limit)
     return projects
 
 
 def get_project_db(cur, id):
-    cur.execute(
-        """
-        SELECT p.*, c.name as client_name
-        FROM projects p
-        JOIN clients c ON p.client_id = c.id
-        WHERE p.id = %s;
-    """,
-        (id,),
-    )
-    project = cur.fetchone()
-    return project
+    cur.execute("SELECT * FROM projects_v WHERE id = %s;", (id,))
+    rows = _rows_as_dicts(cur)
+    return rows[0] if rows else None
 
 
 def update_project_db(cur, id, updates):
-    set_clauses = []
-    values = []
-    for key, value in updates.items():
-        set_clauses.append(f"{key} = %s")
-        values.append(value)
-
-    if not set_clauses:
-        return {"error": "Nenhum dado fornecido para atualização."}
-
-    values.append(id)
-    query = f"UPDATE projects SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-    cur.execute(query, values)
-    updated_id = cur.fetchone()
-    if updated_id:
-        return {"message": "Projeto atualizado com sucesso", "id": str(updated_id[0])}
+    row = _update_by_id(cur, UPDATE_PROJECT_SQL, PROJECT_COLS, id, updates)
+    if isinstance(row, dict) and "error" in row:
+        return row
+    if row:
+        return {
+            "message": "Projeto atualizado com sucesso",
+            "id": str(row["id"]),
+            "row": row,
+        }
     return {"error": "Projeto não encontrado."}
 
 
 def delete_project_db(cur, id):
-    cur.execute("DELETE FROM projects WHERE id = %s RETURNING id;", (id,))
+    _execute_prepared(cur, "delete_projects_by_id", (id,))
     deleted_id = cur.fetchone()
     if deleted_id:
         return {"message": "Projeto deletado com sucesso", "id": str(deleted_id[0])}
@@ -630,9 +1108,9 @@ def add_project_service_db(
     unit=None,
     measure=None,
 ):
-    cur.execute(
-        """INSERT INTO project_services (project_id, name, duration, start_date, end_date, progress, cost, unit, measure)
-           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id;""",
+    _execute_prepared(
+        cur,
+        "insert_project_services",
         (
             project_id,
             name,
@@ -652,42 +1130,77 @@ def add_project_service_db(
     }
 
 
-def get_project_services_db(cur, project_id=None):
+def add_project_services_bulk_db(cur, project_id, services):
+    """
+    Insere vários serviços de um projeto em um único INSERT via execute_values,
+    evitando um round-trip ao banco por linha.
+    """
+    rows = [
+        (
+            project_id,
+            s.get("name"),
+            s.get("duration"),
+            s.get("start_date"),
+            s.get("end_date"),
+            s.get("progress", 0),
+            s.get("cost"),
+            s.get("unit"),
+            s.get("measure"),
+        )
+        for s in services
+    ]
+    if not rows:
+        return {"error": "Nenhum serviço fornecido para inserção."}
+    ids = execute_values(
+        cur,
+        """INSERT INTO project_services (project_id, name, duration, start_date, end_date, progress, cost, unit, measure)
+           VALUES %s RETURNING id;""",
+        rows,
+        fetch=True,
+    )
+    return {
+        "message": "Serviços do projeto adicionados com sucesso",
+        "ids": [str(r[0]) for r in ids],
+    }
+
+
+def get_project_services_db(cur, project_id=None, after=None, limit=None):
     if project_id:
-        cur.execute(
-            "SELECT * FROM project_services WHERE project_id = %s ORDER BY name;",
-            (project_id,),
+        services = _fetch_list_page(
+            cur,
+            "project_services",
+            PROJECT_SERVICE_LIST_COLS,
+            after,
+            limit,
+            extra_where="project_id = %s",
+            params=(project_id,),
         )
     else:
-        cur.execute("SELECT * FROM project_services ORDER BY name;")
-    services = cur.fetchall()
+        services = _fetch_list_page(
+            cur, "project_services", PROJECT_SERVICE_LIST_COLS, after, limit
+        )
     return services
 
 
 def update_project_service_db(cur, id, updates):
-    set_clauses = []
-    values = []
-    for key, value in updates.items():
-        set_clauses.append(f"{key} = %s")
-        values.append(value)
-
-    if not set_clauses:
-        return {"error": "Nenhum dado fornecido para atualização."}
-
-    values.append(id)
-    query = f"UPDATE project_services SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-    cur.execute(query, values)
-    updated_id = cur.fetchone()
-    if updated_id:
+    row = _update_by_id(cur, UPDATE_PROJECT_SERVICE_SQL, PROJECT_SERVICE_COLS, id, updates)
+    if isinstance(row, dict) and "error" in row:
+        return row
+    if row:
         return {
             "message": "Serviço do projeto atualizado com sucesso",
-            "id": str(updated_id[0]),
+            "id": str(row["id"]),
+            "row": row,
         }
     return {"error": "Serviço do projeto não encontrado."}
 
 
+def bulk_update_project_services_db(cur, edits):
+    return _bulk_update_by_ids(cur, UPDATE_PROJECT_SERVICE_SQL, PROJECT_SERVICE_COLS, edits)
+
+
 def delete_project_service_db(cur, id):
-    cur.execute("DELETE FROM project_services WHERE id = %s RETURNING id;", (id,))
+    _execute_prepared(cur, "delete_project_services_by_id", (id,))
     deleted_id = cur.fetchone()
     if deleted_id:
         return {
@@ -708,118 +1221,118 @@ def add_project_document_db(
     uploaded_by=None,
     notes=None,
 ):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute(
-            """INSERT INTO project_documents (project_id, name, type, file_url, size_kb, upload_date, uploaded_by, notes)
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id;""",
-            (
-                project_id,
-                name,
-                doc_type,
-                file_url,
-                size_kb,
-                upload_date,
-                uploaded_by,
-                notes,
-            ),
-        )
-        document_id = cur.fetchone()[0]
-        conn.commit()
-        return {
-            "message": "Documento do projeto adicionado com sucesso",
-            "id": str(document_id),
-        }
+        with db_cursor(dict_cursor=True) as cur:
+            cur.execute(
+                """INSERT INTO project_documents (project_id, name, type, file_url, size_kb, upload_date, uploaded_by, notes)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING *;""",
+                (
+                    project_id,
+                    name,
+                    doc_type,
+                    file_url,
+                    size_kb,
+                    upload_date,
+                    uploaded_by,
+                    notes,
+                ),
+            )
+            row = cur.fetchone()
+            return {
+                "message": "Documento do projeto adicionado com sucesso",
+                "id": str(row["id"]),
+                "row": dict(row),
+            }
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
+
+
+def add_project_documents_bulk_db(cur, project_id, documents):
+    """
+    Insere vários documentos de um projeto em um único INSERT via execute_values.
+    Útil para uploads múltiplos, que antes gerariam um round-trip por arquivo.
+    """
+    rows = [
+        (
+            project_id,
+            d.get("name"),
+            d.get("doc_type"),
+            d.get("file_url"),
+            d.get("size_kb"),
+            d.get("upload_date"),
+            d.get("uploaded_by"),
+            d.get("notes"),
+        )
+        for d in documents
+    ]
+    if not rows:
+        return {"error": "Nenhum documento fornecido para inserção."}
+    ids = execute_values(
+        cur,
+        """INSERT INTO project_documents (project_id, name, type, file_url, size_kb, upload_date, uploaded_by, notes)
+           VALUES %s RETURNING id;""",
+        rows,
+        fetch=True,
+    )
+    return {
+        "message": "Documentos do projeto adicionados com sucesso",
+        "ids": [str(r[0]) for r in ids],
+    }
 
 
 def get_project_documents_db(project_id=None):
-    conn = get_db_connection()
-    if not conn:
-        return []
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cols = ", ".join(PROJECT_DOCUMENT_LIST_COLS)
     try:
-        if project_id:
-            cur.execute(
-                "SELECT * FROM project_documents WHERE project_id = %s ORDER BY name;",
-                (project_id,),
-            )
-        else:
-            cur.execute("SELECT * FROM project_documents ORDER BY name;")
-        documents = cur.fetchall()
-        return documents
+        with db_cursor(dict_cursor=True, autocommit=True) as cur:
+            if project_id:
+                cur.execute(
+                    f"SELECT {cols} FROM project_documents WHERE project_id = %s ORDER BY name;",
+                    (project_id,),
+                )
+            else:
+                cur.execute(f"SELECT {cols} FROM project_documents ORDER BY name;")
+            documents = cur.fetchall()
+            return documents
     except Exception as e:
         st.error(f"Erro ao obter documentos do projeto: {e}")
-        return []
-    finally:
-        cur.close()
+        raise
 
 
 def update_project_document_db(id, updates):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        set_clauses = []
-        values = []
-        for key, value in updates.items():
-            if (
-                key == "doc_type"
-            ):  # 'type' é palavra reservada em Python, mapear para 'type' do DB
-                set_clauses.append("type = %s")
-            else:
-                set_clauses.append(f"{key} = %s")
-            values.append(value)
-
-        if not set_clauses:
-            return {"error": "Nenhum dado fornecido para atualização."}
-
-        values.append(id)
-        query = f"UPDATE project_documents SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-        cur.execute(query, values)
-        updated_id = cur.fetchone()
-        conn.commit()
-        if updated_id:
-            return {
-                "message": "Documento do projeto atualizado com sucesso",
-                "id": str(updated_id[0]),
+        with db_cursor() as cur:
+            # 'type' é palavra reservada em Python; o chamador envia doc_type
+            updates = {
+                ("type" if key == "doc_type" else key): value
+                for key, value in updates.items()
             }
-        return {"error": "Documento do projeto não encontrado."}
+            row = _partial_update_by_id(cur, "project_documents", id, updates)
+            if isinstance(row, dict) and "error" in row:
+                return row
+            if row:
+                return {
+                    "message": "Documento do projeto atualizado com sucesso",
+                    "id": str(row["id"]),
+                    "row": row,
+                }
+            return {"error": "Documento do projeto não encontrado."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 def delete_project_document_db(id):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute("DELETE FROM project_documents WHERE id = %s RETURNING id;", (id,))
-        deleted_id = cur.fetchone()
-        conn.commit()
-        if deleted_id:
-            return {
-                "message": "Documento do projeto deletado com sucesso",
-                "id": str(deleted_id[0]),
-            }
-        return {"error": "Documento do projeto não encontrado."}
+        with db_cursor(autocommit=True) as cur:
+            _execute_prepared(cur, "delete_project_documents_by_id", (id,))
+            deleted_id = cur.fetchone()
+            if deleted_id:
+                return {
+                    "message": "Documento do projeto deletado com sucesso",
+                    "id": str(deleted_id[0]),
+                }
+            return {"error": "Documento do projeto não encontrado."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 # --- Funções CRUD para Versões de Documentos ---
@@ -831,104 +1344,71 @@ def add_document_version_db(
     uploaded_by=None,
     notes=None,
 ):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute(
-            """INSERT INTO document_versions (document_id, version_number, file_url, upload_date, uploaded_by, notes)
-               VALUES (%s, %s, %s, %s, %s, %s) RETURNING id;""",
-            (document_id, version_number, file_url, upload_date, uploaded_by, notes),
-        )
-        version_id = cur.fetchone()[0]
-        conn.commit()
-        return {
-            "message": "Versão do documento adicionada com sucesso",
-            "id": str(version_id),
-        }
+        with db_cursor(dict_cursor=True) as cur:
+            cur.execute(
+                """INSERT INTO document_versions (document_id, version_number, file_url, upload_date, uploaded_by, notes)
+                   VALUES (%s, %s, %s, %s, %s, %s) RETURNING *;""",
+                (document_id, version_number, file_url, upload_date, uploaded_by, notes),
+            )
+            row = cur.fetchone()
+            return {
+                "message": "Versão do documento adicionada com sucesso",
+                "id": str(row["id"]),
+                "row": dict(row),
+            }
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 def get_document_versions_db(document_id=None):
-    conn = get_db_connection()
-    if not conn:
-        return []
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cols = ", ".join(DOCUMENT_VERSION_LIST_COLS)
     try:
-        if document_id:
-            cur.execute(
-                "SELECT * FROM document_versions WHERE document_id = %s ORDER BY version_number DESC;",
-                (document_id,),
-            )
-        else:
-            cur.execute("SELECT * FROM document_versions ORDER BY created_at DESC;")
-        versions = cur.fetchall()
-        return versions
+        with db_cursor(dict_cursor=True, autocommit=True) as cur:
+            if document_id:
+                cur.execute(
+                    f"SELECT {cols} FROM document_versions WHERE document_id = %s ORDER BY version_number DESC;",
+                    (document_id,),
+                )
+            else:
+                cur.execute(f"SELECT {cols} FROM document_versions ORDER BY created_at DESC;")
+            versions = cur.fetchall()
+            return versions
     except Exception as e:
         st.error(f"Erro ao obter versões de documentos: {e}")
-        return []
-    finally:
-        cur.close()
+        raise
 
 
 def update_document_version_db(id, updates):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        set_clauses = []
-        values = []
-        for key, value in updates.items():
-            set_clauses.append(f"{key} = %s")
-            values.append(value)
-
-        if not set_clauses:
-            return {"error": "Nenhum dado fornecido para atualização."}
-
-        values.append(id)
-        query = f"UPDATE document_versions SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-        cur.execute(query, values)
-        updated_id = cur.fetchone()
-        conn.commit()
-        if updated_id:
-            return {
-                "message": "Versão do documento atualizada com sucesso",
-                "id": str(updated_id[0]),
-            }
-        return {"error": "Versão do documento não encontrada."}
+        with db_cursor() as cur:
+            row = _partial_update_by_id(cur, "document_versions", id, updates)
+            if isinstance(row, dict) and "error" in row:
+                return row
+            if row:
+                return {
+                    "message": "Versão do documento atualizada com sucesso",
+                    "id": str(row["id"]),
+                    "row": row,
+                }
+            return {"error": "Versão do documento não encontrada."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 def delete_document_version_db(id):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute("DELETE FROM document_versions WHERE id = %s RETURNING id;", (id,))
-        deleted_id = cur.fetchone()
-        conn.commit()
-        if deleted_id:
-            return {
-                "message": "Versão do documento deletada com sucesso",
-                "id": str(deleted_id[0]),
-            }
-        return {"error": "Versão do documento não encontrada."}
+        with db_cursor(autocommit=True) as cur:
+            _execute_prepared(cur, "delete_document_versions_by_id", (id,))
+            deleted_id = cur.fetchone()
+            if deleted_id:
+                return {
+                    "message": "Versão do documento deletada com sucesso",
+                    "id": str(deleted_id[0]),
+                }
+            return {"error": "Versão do documento não encontrada."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 # --- Funções CRUD para Diários de Obra (RDOs) ---
@@ -944,112 +1424,204 @@ def add_daily_log_db(
     location_lat=None,
     location_lon=None,
 ):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute(
-            """INSERT INTO daily_logs (project_id, log_date, weather, personnel, notes, materials_received, equipment_used, occurrences, location_lat, location_lon)
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING id;""",
-            (
-                project_id,
-                log_date,
-                weather,
-                personnel,
-                notes,
-                materials_received,
-                equipment_used,
-                occurrences,
-                location_lat,
-                location_lon,
-            ),
-        )
-        log_id = cur.fetchone()[0]
-        conn.commit()
-        return {"message": "Diário de obra adicionado com sucesso", "id": str(log_id)}
+        with db_cursor(dict_cursor=True) as cur:
+            cur.execute(
+                """INSERT INTO daily_logs (project_id, log_date, weather, personnel, notes, materials_received, equipment_used, occurrences, location_lat, location_lon)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING *;""",
+                (
+                    project_id,
+                    log_date,
+                    weather,
+                    personnel,
+                    notes,
+                    materials_received,
+                    equipment_used,
+                    occurrences,
+                    location_lat,
+                    location_lon,
+                ),
+            )
+            row = cur.fetchone()
+            return {
+                "message": "Diário de obra adicionado com sucesso",
+                "id": str(row["id"]),
+                "row": dict(row),
+            }
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
-def get_daily_logs_db(project_id=None):
-    conn = get_db_connection()
-    if not conn:
-        return []
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+def add_daily_log_full_db(
+    project_id,
+    log_date,
+    activities=None,
+    costs=None,
+    photos=None,
+    **log_fields,
+):
+    """
+    Salva o RDO e todos os filhos (atividades, custos, fotos) numa única
+    transação: um único commit/flush de WAL no final, e tudo é desfeito em
+    bloco se qualquer inserção falhar — em vez de um commit por chamada.
+    log_fields aceita as mesmas colunas opcionais de add_daily_log_db.
+    """
     try:
-        if project_id:
+        with db_cursor() as cur:
             cur.execute(
-                "SELECT * FROM daily_logs WHERE project_id = %s ORDER BY log_date DESC;",
-                (project_id,),
+                """INSERT INTO daily_logs (project_id, log_date, weather, personnel, notes, materials_received, equipment_used, occurrences, location_lat, location_lon)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s) RETURNING *;""",
+                (
+                    project_id,
+                    log_date,
+                    log_fields.get("weather"),
+                    log_fields.get("personnel"),
+                    log_fields.get("notes"),
+                    log_fields.get("materials_received"),
+                    log_fields.get("equipment_used"),
+                    log_fields.get("occurrences"),
+                    log_fields.get("location_lat"),
+                    log_fields.get("location_lon"),
+                ),
             )
-        else:
-            cur.execute("SELECT * FROM daily_logs ORDER BY log_date DESC;")
-        logs = cur.fetchall()
-        return logs
+            log_row = _rows_as_dicts(cur)[0]
+            daily_log_id = log_row["id"]
+            result = {
+                "message": "Diário de obra salvo com sucesso",
+                "id": str(daily_log_id),
+                "row": log_row,
+            }
+            if activities:
+                result["activity_ids"] = add_daily_log_activities_bulk_db(
+                    cur, daily_log_id, activities
+                )["ids"]
+            if costs:
+                result["cost_ids"] = add_daily_log_costs_bulk_db(
+                    cur, daily_log_id, costs
+                )["ids"]
+            if photos:
+                result["photo_ids"] = add_daily_log_photos_bulk_db(
+                    cur, daily_log_id, photos
+                )["ids"]
+            return result
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def get_daily_logs_db(project_id=None, after=None, limit=None):
+    try:
+        with db_cursor(dict_cursor=True, autocommit=True) as cur:
+            logs = _fetch_desc_page(
+                cur,
+                "daily_logs",
+                DAILY_LOG_LIST_COLS,
+                "log_date",
+                "project_id",
+                project_id,
+                after,
+                limit,
+            )
+            return logs
     except Exception as e:
         st.error(f"Erro ao obter diários de obra: {e}")
-        return []
-    finally:
-        cur.close()
+        raise
 
 
-def update_daily_log_db(id, updates):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
+def iter_daily_logs(project_id=None, itersize=500):
+    """
+    Versão streaming de get_daily_logs_db para exportações/relatórios:
+    percorre os RDOs por um cursor nomeado (iter_query) sem materializar a
+    tabela inteira em memória de uma vez.
+    """
+    cols = ", ".join(DAILY_LOG_LIST_COLS)
+    if project_id:
+        return iter_query(
+            f"SELECT {cols} FROM daily_logs WHERE project_id = %s ORDER BY log_date DESC;",
+            (project_id,),
+            itersize,
+        )
+    return iter_query(
+        f"SELECT {cols} FROM daily_logs ORDER BY log_date DESC;", itersize=itersize
+    )
+
+
+def get_daily_log_db(id):
+    """
+    Detalhe de um RDO: busca todas as colunas de uma única linha, ao
+    contrário da listagem, que projeta apenas DAILY_LOG_LIST_COLS.
+    """
+    try:
+        with db_cursor(dict_cursor=True, autocommit=True) as cur:
+            cur.execute("SELECT * FROM daily_logs WHERE id = %s;", (id,))
+            row = cur.fetchone()
+            return dict(row) if row else None
+    except Exception as e:
+        st.error(f"Erro ao obter diário de obra: {e}")
+        return None
+
+
+def get_daily_log_bundle_db(daily_log_id):
+    """
+    Atividades, custos e fotos de um RDO em um único round-trip: três
+    sub-selects com json_agg na mesma consulta, em vez de três chamadas
+    (e três empréstimos de conexão) ao abrir o detalhe do diário.
+    """
     try:
-        set_clauses = []
-        values = []
-        for key, value in updates.items():
-            set_clauses.append(f"{key} = %s")
-            values.append(value)
-
-        if not set_clauses:
-            return {"error": "Nenhum dado fornecido para atualização."}
-
-        values.append(id)
-        query = f"UPDATE daily_logs SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-        cur.execute(query, values)
-        updated_id = cur.fetchone()
-        conn.commit()
-        if updated_id:
+        with db_cursor(dict_cursor=True, autocommit=True) as cur:
+            cur.execute(
+                """SELECT
+                       (SELECT json_agg(a ORDER BY a.created_at DESC)
+                        FROM daily_log_activities a
+                        WHERE a.daily_log_id = %s) AS activities,
+                       (SELECT json_agg(c ORDER BY c.created_at DESC)
+                        FROM daily_log_costs c
+                        WHERE c.daily_log_id = %s) AS costs,
+                       (SELECT json_agg(p ORDER BY p.upload_date DESC)
+                        FROM daily_log_photos p
+                        WHERE p.daily_log_id = %s) AS photos;""",
+                (daily_log_id, daily_log_id, daily_log_id),
+            )
+            row = cur.fetchone()
             return {
-                "message": "Diário de obra atualizado com sucesso",
-                "id": str(updated_id[0]),
+                "activities": row["activities"] or [],
+                "costs": row["costs"] or [],
+                "photos": row["photos"] or [],
             }
-        return {"error": "Diário de obra não encontrado."}
     except Exception as e:
-        conn.rollback()
+        st.error(f"Erro ao obter dados do diário de obra: {e}")
+        return {"activities": [], "costs": [], "photos": []}
+
+
+def update_daily_log_db(id, updates):
+    try:
+        with db_cursor() as cur:
+            row = _partial_update_by_id(cur, "daily_logs", id, updates)
+            if isinstance(row, dict) and "error" in row:
+                return row
+            if row:
+                return {
+                    "message": "Diário de obra atualizado com sucesso",
+                    "id": str(row["id"]),
+                    "row": row,
+                }
+            return {"error": "Diário de obra não encontrado."}
+    except Exception as e:
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 def delete_daily_log_db(id):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute("DELETE FROM daily_logs WHERE id = %s RETURNING id;", (id,))
-        deleted_id = cur.fetchone()
-        conn.commit()
-        if deleted_id:
-            return {
-                "message": "Diário de obra deletado com sucesso",
-                "id": str(deleted_id[0]),
-            }
-        return {"error": "Diário de obra não encontrado."}
+        with db_cursor(autocommit=True) as cur:
+            _execute_prepared(cur, "delete_daily_logs_by_id", (id,))
+            deleted_id = cur.fetchone()
+            if deleted_id:
+                return {
+                    "message": "Diário de obra deletado com sucesso",
+                    "id": str(deleted_id[0]),
+                }
+            return {"error": "Diário de obra não encontrado."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 # --- Funções CRUD para Atividades do RDO ---
@@ -1061,401 +1633,713 @@ def add_daily_log_activity_db(
     unit=None,
     observations=None,
 ):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute(
-            """INSERT INTO daily_log_activities (daily_log_id, step_name, activity_type, quantity, unit, observations)
-               VALUES (%s, %s, %s, %s, %s, %s) RETURNING id;""",
-            (daily_log_id, step_name, activity_type, quantity, unit, observations),
-        )
-        activity_id = cur.fetchone()[0]
-        conn.commit()
-        return {
-            "message": "Atividade do diário de obra adicionada com sucesso",
-            "id": str(activity_id),
-        }
+        with db_cursor(dict_cursor=True) as cur:
+            cur.execute(
+                """INSERT INTO daily_log_activities (daily_log_id, step_name, activity_type, quantity, unit, observations)
+                   VALUES (%s, %s, %s, %s, %s, %s) RETURNING *;""",
+                (daily_log_id, step_name, activity_type, quantity, unit, observations),
+            )
+            row = cur.fetchone()
+            return {
+                "message": "Atividade do diário de obra adicionada com sucesso",
+                "id": str(row["id"]),
+                "row": dict(row),
+            }
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
-def get_daily_log_activities_db(daily_log_id=None):
-    conn = get_db_connection()
-    if not conn:
-        return []
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+def add_daily_log_activities_bulk_db(cur, daily_log_id, activities):
+    """
+    Insere várias atividades de um RDO em um único INSERT via execute_values,
+    em vez de um round-trip por linha.
+    """
+    rows = [
+        (
+            daily_log_id,
+            a.get("step_name"),
+            a.get("activity_type"),
+            a.get("quantity"),
+            a.get("unit"),
+            a.get("observations"),
+        )
+        for a in activities
+    ]
+    if not rows:
+        return {"error": "Nenhuma atividade fornecida para inserção."}
+    ids = execute_values(
+        cur,
+        """INSERT INTO daily_log_activities (daily_log_id, step_name, activity_type, quantity, unit, observations)
+           VALUES %s RETURNING id;""",
+        rows,
+        page_size=500,
+        fetch=True,
+    )
+    return {
+        "message": "Atividades do diário de obra adicionadas com sucesso",
+        "ids": [str(r[0]) for r in ids],
+    }
+
+
+def copy_daily_log_activities_db(cur, daily_log_id, activities):
+    """
+    Ingestão em massa de atividades via COPY ... FROM STDIN, o caminho de
+    maior vazão do Postgres. Indicado para importações grandes (milhares de
+    linhas); para lotes menores o add_daily_log_activities_bulk_db basta.
+    Como COPY não suporta RETURNING, os UUIDs são gerados no cliente e
+    devolvidos ao chamador.
+    """
+    if not activities:
+        return {"error": "Nenhuma atividade fornecida para inserção."}
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    ids = []
+    for a in activities:
+        new_id = str(uuid.uuid4())
+        ids.append(new_id)
+        writer.writerow(
+            [
+                new_id,
+                daily_log_id,
+                a.get("step_name"),
+                a.get("activity_type"),
+                a.get("quantity"),
+                a.get("unit"),
+                a.get("observations"),
+            ]
+        )
+    buf.seek(0)
+    cur.copy_expert(
+        """COPY daily_log_activities (id, daily_log_id, step_name, activity_type, quantity, unit, observations)
+           FROM STDIN WITH (FORMAT csv);""",
+        buf,
+    )
+    return {
+        "message": "Atividades do diário de obra importadas com sucesso",
+        "ids": ids,
+    }
+
+
+def get_daily_log_activities_db(daily_log_id=None, after=None, limit=None):
     try:
-        if daily_log_id:
-            cur.execute(
-                "SELECT * FROM daily_log_activities WHERE daily_log_id = %s ORDER BY created_at DESC;",
-                (daily_log_id,),
+        with db_cursor(dict_cursor=True, autocommit=True) as cur:
+            activities = _fetch_desc_page(
+                cur,
+                "daily_log_activities",
+                DAILY_LOG_ACTIVITY_LIST_COLS,
+                "created_at",
+                "daily_log_id",
+                daily_log_id,
+                after,
+                limit,
             )
-        else:
-            cur.execute("SELECT * FROM daily_log_activities ORDER BY created_at DESC;")
-        activities = cur.fetchall()
-        return activities
+            return activities
     except Exception as e:
         st.error(f"Erro ao obter atividades do diário de obra: {e}")
-        return []
-    finally:
-        cur.close()
+        raise
 
 
 def update_daily_log_activity_db(id, updates):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        set_clauses = []
-        values = []
-        for key, value in updates.items():
-            set_clauses.append(f"{key} = %s")
-            values.append(value)
-
-        if not set_clauses:
-            return {"error": "Nenhum dado fornecido para atualização."}
-
-        values.append(id)
-        query = f"UPDATE daily_log_activities SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-        cur.execute(query, values)
-        updated_id = cur.fetchone()
-        conn.commit()
-        if updated_id:
-            return {
-                "message": "Atividade do diário de obra atualizada com sucesso",
-                "id": str(updated_id[0]),
-            }
-        return {"error": "Atividade do diário de obra não encontrada."}
+        with db_cursor() as cur:
+            row = _partial_update_by_id(cur, "daily_log_activities", id, updates)
+            if isinstance(row, dict) and "error" in row:
+                return row
+            if row:
+                return {
+                    "message": "Atividade do diário de obra atualizada com sucesso",
+                    "id": str(row["id"]),
+                    "row": row,
+                }
+            return {"error": "Atividade do diário de obra não encontrada."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 def delete_daily_log_activity_db(id):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "DELETE FROM daily_log_activities WHERE id = %s RETURNING id;", (id,)
-        )
-        deleted_id = cur.fetchone()
-        conn.commit()
-        if deleted_id:
-            return {
-                "message": "Atividade do diário de obra deletada com sucesso",
-                "id": str(deleted_id[0]),
-            }
-        return {"error": "Atividade do diário de obra não encontrada."}
+        with db_cursor(autocommit=True) as cur:
+            _execute_prepared(cur, "delete_daily_log_activities_by_id", (id,))
+            deleted_id = cur.fetchone()
+            if deleted_id:
+                return {
+                    "message": "Atividade do diário de obra deletada com sucesso",
+                    "id": str(deleted_id[0]),
+                }
+            return {"error": "Atividade do diário de obra não encontrada."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 # --- Funções CRUD para Custos do RDO ---
 def add_daily_log_cost_db(
     daily_log_id, description, value, category=None, associated_step=None
 ):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute(
-            """INSERT INTO daily_log_costs (daily_log_id, description, value, category, associated_step)
-               VALUES (%s, %s, %s, %s, %s) RETURNING id;""",
-            (daily_log_id, description, value, category, associated_step),
-        )
-        cost_id = cur.fetchone()[0]
-        conn.commit()
-        return {
-            "message": "Custo do diário de obra adicionado com sucesso",
-            "id": str(cost_id),
-        }
+        with db_cursor(dict_cursor=True) as cur:
+            cur.execute(
+                """INSERT INTO daily_log_costs (daily_log_id, description, value, category, associated_step)
+                   VALUES (%s, %s, %s, %s, %s) RETURNING *;""",
+                (daily_log_id, description, value, category, associated_step),
+            )
+            row = cur.fetchone()
+            return {
+                "message": "Custo do diário de obra adicionado com sucesso",
+                "id": str(row["id"]),
+                "row": dict(row),
+            }
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
-def get_daily_log_costs_db(daily_log_id=None):
-    conn = get_db_connection()
-    if not conn:
-        return []
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+def add_daily_log_costs_bulk_db(cur, daily_log_id, costs):
+    """
+    Insere vários custos de um RDO em um único INSERT via execute_values.
+    """
+    rows = [
+        (
+            daily_log_id,
+            c.get("description"),
+            c.get("value"),
+            c.get("category"),
+            c.get("associated_step"),
+        )
+        for c in costs
+    ]
+    if not rows:
+        return {"error": "Nenhum custo fornecido para inserção."}
+    ids = execute_values(
+        cur,
+        """INSERT INTO daily_log_costs (daily_log_id, description, value, category, associated_step)
+           VALUES %s RETURNING id;""",
+        rows,
+        page_size=500,
+        fetch=True,
+    )
+    return {
+        "message": "Custos do diário de obra adicionados com sucesso",
+        "ids": [str(r[0]) for r in ids],
+    }
+
+
+def get_daily_log_costs_db(daily_log_id=None, after=None, limit=None):
     try:
-        if daily_log_id:
-            cur.execute(
-                "SELECT * FROM daily_log_costs WHERE daily_log_id = %s ORDER BY created_at DESC;",
-                (daily_log_id,),
+        with db_cursor(dict_cursor=True, autocommit=True) as cur:
+            costs = _fetch_desc_page(
+                cur,
+                "daily_log_costs",
+                DAILY_LOG_COST_LIST_COLS,
+                "created_at",
+                "daily_log_id",
+                daily_log_id,
+                after,
+                limit,
             )
-        else:
-            cur.execute("SELECT * FROM daily_log_costs ORDER BY created_at DESC;")
-        costs = cur.fetchall()
-        return costs
+            return costs
     except Exception as e:
         st.error(f"Erro ao obter custos do diário de obra: {e}")
-        return []
-    finally:
-        cur.close()
+        raise
 
 
 def update_daily_log_cost_db(id, updates):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        set_clauses = []
-        values = []
-        for key, value in updates.items():
-            set_clauses.append(f"{key} = %s")
-            values.append(value)
-
-        if not set_clauses:
-            return {"error": "Nenhum dado fornecido para atualização."}
-
-        values.append(id)
-        query = f"UPDATE daily_log_costs SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-        cur.execute(query, values)
-        updated_id = cur.fetchone()
-        conn.commit()
-        if updated_id:
-            return {
-                "message": "Custo do diário de obra atualizado com sucesso",
-                "id": str(updated_id[0]),
-            }
-        return {"error": "Custo do diário de obra não encontrado."}
+        with db_cursor() as cur:
+            row = _partial_update_by_id(cur, "daily_log_costs", id, updates)
+            if isinstance(row, dict) and "error" in row:
+                return row
+            if row:
+                return {
+                    "message": "Custo do diário de obra atualizado com sucesso",
+                    "id": str(row["id"]),
+                    "row": row,
+                }
+            return {"error": "Custo do diário de obra não encontrado."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 def delete_daily_log_cost_db(id):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute("DELETE FROM daily_log_costs WHERE id = %s RETURNING id;", (id,))
-        deleted_id = cur.fetchone()
-        conn.commit()
-        if deleted_id:
-            return {
-                "message": "Custo do diário de obra deletado com sucesso",
-                "id": str(deleted_id[0]),
-            }
-        return {"error": "Custo do diário de obra não encontrado."}
+        with db_cursor(autocommit=True) as cur:
+            _execute_prepared(cur, "delete_daily_log_costs_by_id", (id,))
+            deleted_id = cur.fetchone()
+            if deleted_id:
+                return {
+                    "message": "Custo do diário de obra deletado com sucesso",
+                    "id": str(deleted_id[0]),
+                }
+            return {"error": "Custo do diário de obra não encontrado."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
 # --- Funções CRUD para Fotos do RDO ---
 def add_daily_log_photo_db(
     daily_log_id, photo_url, description=None, upload_date=None, uploaded_by=None
 ):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute(
-            """INSERT INTO daily_log_photos (daily_log_id, photo_url, description, upload_date, uploaded_by)
-               VALUES (%s, %s, %s, %s, %s) RETURNING id;""",
-            (daily_log_id, photo_url, description, upload_date, uploaded_by),
-        )
-        photo_id = cur.fetchone()[0]
-        conn.commit()
-        return {
-            "message": "Foto do diário de obra adicionada com sucesso",
-            "id": str(photo_id),
-        }
+        with db_cursor(dict_cursor=True) as cur:
+            cur.execute(
+                """INSERT INTO daily_log_photos (daily_log_id, photo_url, description, upload_date, uploaded_by)
+                   VALUES (%s, %s, %s, %s, %s) RETURNING *;""",
+                (daily_log_id, photo_url, description, upload_date, uploaded_by),
+            )
+            row = cur.fetchone()
+            return {
+                "message": "Foto do diário de obra adicionada com sucesso",
+                "id": str(row["id"]),
+                "row": dict(row),
+            }
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
+
+
+def add_daily_log_photos_bulk_db(cur, daily_log_id, photos):
+    """
+    Insere várias fotos de um RDO em um único INSERT via execute_values.
+    """
+    rows = [
+        (
+            daily_log_id,
+            p.get("photo_url"),
+            p.get("description"),
+            p.get("upload_date"),
+            p.get("uploaded_by"),
+        )
+        for p in photos
+    ]
+    if not rows:
+        return {"error": "Nenhuma foto fornecida para inserção."}
+    ids = execute_values(
+        cur,
+        """INSERT INTO daily_log_photos (daily_log_id, photo_url, description, upload_date, uploaded_by)
+           VALUES %s RETURNING id;""",
+        rows,
+        page_size=500,
+        fetch=True,
+    )
+    return {
+        "message": "Fotos do diário de obra adicionadas com sucesso",
+        "ids": [str(r[0]) for r in ids],
+    }
+
+
+def copy_daily_log_photos_db(cur, daily_log_id, photos):
+    """
+    Ingestão em massa de fotos via COPY ... FROM STDIN, para galerias
+    grandes (centenas de uploads): evita o overhead por linha do protocolo
+    de INSERT. Para lotes menores o add_daily_log_photos_bulk_db basta.
+    Como COPY não suporta RETURNING, os UUIDs são gerados no cliente e
+    devolvidos ao chamador.
+    """
+    if not photos:
+        return {"error": "Nenhuma foto fornecida para inserção."}
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    ids = []
+    for p in photos:
+        new_id = str(uuid.uuid4())
+        ids.append(new_id)
+        writer.writerow(
+            [
+                new_id,
+                daily_log_id,
+                p.get("photo_url"),
+                p.get("description"),
+                p.get("upload_date"),
+                p.get("uploaded_by"),
+            ]
+        )
+    buf.seek(0)
+    cur.copy_expert(
+        """COPY daily_log_photos (id, daily_log_id, photo_url, description, upload_date, uploaded_by)
+           FROM STDIN WITH (FORMAT csv);""",
+        buf,
+    )
+    return {
+        "message": "Fotos do diário de obra importadas com sucesso",
+        "ids": ids,
+    }
 
 
 def get_daily_log_photos_db(daily_log_id=None):
-    conn = get_db_connection()
-    if not conn:
-        return []
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+    cols = ", ".join(DAILY_LOG_PHOTO_LIST_COLS)
     try:
-        if daily_log_id:
-            cur.execute(
-                "SELECT * FROM daily_log_photos WHERE daily_log_id = %s ORDER BY upload_date DESC;",
-                (daily_log_id,),
-            )
-        else:
-            cur.execute("SELECT * FROM daily_log_photos ORDER BY upload_date DESC;")
-        photos = cur.fetchall()
-        return photos
+        with db_cursor(dict_cursor=True, autocommit=True) as cur:
+            if daily_log_id:
+                cur.execute(
+                    f"SELECT {cols} FROM daily_log_photos WHERE daily_log_id = %s ORDER BY upload_date DESC;",
+                    (daily_log_id,),
+                )
+            else:
+                cur.execute(f"SELECT {cols} FROM daily_log_photos ORDER BY upload_date DESC;")
+            photos = cur.fetchall()
+            return photos
     except Exception as e:
         st.error(f"Erro ao obter fotos do diário de obra: {e}")
-        return []
-    finally:
-        cur.close()
+        raise
+
+
+def iter_daily_log_photos(daily_log_id=None, itersize=500):
+    """
+    Versão streaming de get_daily_log_photos_db, para galerias e exportações
+    com muitas fotos.
+    """
+    cols = ", ".join(DAILY_LOG_PHOTO_LIST_COLS)
+    if daily_log_id:
+        return iter_query(
+            f"SELECT {cols} FROM daily_log_photos WHERE daily_log_id = %s ORDER BY upload_date DESC;",
+            (daily_log_id,),
+            itersize,
+        )
+    return iter_query(
+        f"SELECT {cols} FROM daily_log_photos ORDER BY upload_date DESC;",
+        itersize=itersize,
+    )
 
 
 def update_daily_log_photo_db(id, updates):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        set_clauses = []
-        values = []
-        for key, value in updates.items():
-            set_clauses.append(f"{key} = %s")
-            values.append(value)
-
-        if not set_clauses:
-            return {"error": "Nenhum dado fornecido para atualização."}
-
-        values.append(id)
-        query = f"UPDATE daily_log_photos SET {', '.join(set_clauses)} WHERE id = %s RETURNING id;"
-        cur.execute(query, values)
-        updated_id = cur.fetchone()
-        conn.commit()
-        if updated_id:
+        with db_cursor() as cur:
+            row = _partial_update_by_id(cur, "daily_log_photos", id, updates)
+            if isinstance(row, dict) and "error" in row:
+                return row
+            if row:
+                return {
+                    "message": "Foto do diário de obra atualizada com sucesso",
+                    "id": str(row["id"]),
+                    "row": row,
+                }
+            return {"error": "Foto do diário de obra não encontrada."}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def delete_daily_log_photo_db(id):
+    try:
+        with db_cursor(autocommit=True) as cur:
+            _execute_prepared(cur, "delete_daily_log_photos_by_id", (id,))
+            deleted_id = cur.fetchone()
+            if deleted_id:
+                return {
+                    "message": "Foto do diário de obra deletada com sucesso",
+                    "id": str(deleted_id[0]),
+                }
+            return {"error": "Foto do diário de obra não encontrada."}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+# Deleção em lote dos filhos do RDO: um único DELETE ... WHERE id = ANY(%s)
+# em vez de um round-trip por linha ao limpar várias seleções de uma vez.
+# (Apagar o RDO inteiro não precisa disso: os FKs têm ON DELETE CASCADE.)
+def _delete_by_ids(cur, table, ids):
+    cur.execute(
+        f"DELETE FROM {table} WHERE id = ANY(%s) RETURNING id;",
+        (list(ids),),
+    )
+    return [str(r[0]) for r in cur.fetchall()]
+
+
+def delete_daily_log_activities_bulk_db(ids):
+    if not ids:
+        return {"error": "Nenhum id fornecido para deleção."}
+    try:
+        with db_cursor(autocommit=True) as cur:
+            deleted = _delete_by_ids(cur, "daily_log_activities", ids)
             return {
-                "message": "Foto do diário de obra atualizada com sucesso",
-                "id": str(updated_id[0]),
+                "message": "Atividades do diário de obra deletadas com sucesso",
+                "ids": deleted,
             }
-        return {"error": "Foto do diário de obra não encontrada."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
-def delete_daily_log_photo_db(id):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
+def delete_daily_log_costs_bulk_db(ids):
+    if not ids:
+        return {"error": "Nenhum id fornecido para deleção."}
     try:
-        cur.execute("DELETE FROM daily_log_photos WHERE id = %s RETURNING id;", (id,))
-        deleted_id = cur.fetchone()
-        conn.commit()
-        if deleted_id:
+        with db_cursor(autocommit=True) as cur:
+            deleted = _delete_by_ids(cur, "daily_log_costs", ids)
             return {
-                "message": "Foto do diário de obra deletada com sucesso",
-                "id": str(deleted_id[0]),
+                "message": "Custos do diário de obra deletados com sucesso",
+                "ids": deleted,
             }
-        return {"error": "Foto do diário de obra não encontrada."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
-# --- Funções CRUD para Associação Projeto-Equipe ---
-def add_project_team_member_db(project_id, team_member_id):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
+def delete_daily_log_photos_bulk_db(ids):
+    if not ids:
+        return {"error": "Nenhum id fornecido para deleção."}
     try:
-        cur.execute(
-            """INSERT INTO project_team_members (project_id, team_member_id)
-               VALUES (%s, %s) RETURNING project_id, team_member_id;""",
-            (project_id, team_member_id),
-        )
-        assigned_ids = cur.fetchone()
-        conn.commit()
-        return {
-            "message": "Associação projeto-equipe adicionada com sucesso",
-            "project_id": str(assigned_ids[0]),
-            "team_member_id": str(assigned_ids[1]),
-        }
-    except psycopg2.errors.UniqueViolation:
-        conn.rollback()
-        return {"error": "Associação já existe."}
+        with db_cursor(autocommit=True) as cur:
+            deleted = _delete_by_ids(cur, "daily_log_photos", ids)
+            return {
+                "message": "Fotos do diário de obra deletadas com sucesso",
+                "ids": deleted,
+            }
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
 
 
-def get_project_team_members_db(project_id=None, team_member_id=None):
-    conn = get_db_connection()
-    if not conn:
-        return []
-    cur = conn.cursor(cursor_factory=RealDictCursor)
+# --- Funções CRUD para Associação Projeto-Equipe ---
+def add_project_team_member_db(project_id, team_member_id):
     try:
-        if project_id and team_member_id:
+        with db_cursor() as cur:
+            # ON CONFLICT DO NOTHING: a duplicata vira um fetchone() vazio,
+            # sem UniqueViolation, rollback nem transação abortada.
             cur.execute(
-                "SELECT * FROM project_team_members WHERE project_id = %s AND team_member_id = %s;",
+                """INSERT INTO project_team_members (project_id, team_member_id)
+                   VALUES (%s, %s)
+                   ON CONFLICT (project_id, team_member_id) DO NOTHING
+                   RETURNING project_id, team_member_id;""",
                 (project_id, team_member_id),
             )
-        elif project_id:
-            cur.execute(
-                "SELECT * FROM project_team_members WHERE project_id = %s;",
-                (project_id,),
-            )
-        elif team_member_id:
-            cur.execute(
-                "SELECT * FROM project_team_members WHERE team_member_id = %s;",
-                (team_member_id,),
+            assigned_ids = cur.fetchone()
+            if assigned_ids is None:
+                return {"error": "Associação já existe."}
+            return {
+                "message": "Associação projeto-equipe adicionada com sucesso",
+                "project_id": str(assigned_ids[0]),
+                "team_member_id": str(assigned_ids[1]),
+            }
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def add_project_team_members_bulk_db(project_id, team_member_ids):
+    """
+    Associa vários membros a um projeto em um único INSERT via
+    execute_values; duplicatas são ignoradas pelo ON CONFLICT e só as
+    associações realmente criadas voltam no RETURNING.
+    """
+    rows = [(project_id, team_member_id) for team_member_id in team_member_ids]
+    if not rows:
+        return {"error": "Nenhum membro fornecido para associação."}
+    try:
+        with db_cursor() as cur:
+            assigned = execute_values(
+                cur,
+                """INSERT INTO project_team_members (project_id, team_member_id)
+                   VALUES %s
+                   ON CONFLICT (project_id, team_member_id) DO NOTHING
+                   RETURNING team_member_id;""",
+                rows,
+                page_size=1000,
+                fetch=True,
             )
-        else:
-            cur.execute("SELECT * FROM project_team_members;")
-        associations = cur.fetchall()
-        return associations
+            return {
+                "message": "Associações projeto-equipe adicionadas com sucesso",
+                "team_member_ids": [str(r[0]) for r in assigned],
+            }
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def get_project_team_members_db(project_id=None, team_member_id=None):
+    cols = ", ".join(PROJECT_TEAM_MEMBER_LIST_COLS)
+    try:
+        with db_cursor(dict_cursor=True, autocommit=True) as cur:
+            if project_id and team_member_id:
+                cur.execute(
+                    f"SELECT {cols} FROM project_team_members WHERE project_id = %s AND team_member_id = %s;",
+                    (project_id, team_member_id),
+                )
+            elif project_id:
+                cur.execute(
+                    f"SELECT {cols} FROM project_team_members WHERE project_id = %s;",
+                    (project_id,),
+                )
+            elif team_member_id:
+                cur.execute(
+                    f"SELECT {cols} FROM project_team_members WHERE team_member_id = %s;",
+                    (team_member_id,),
+                )
+            else:
+                cur.execute(f"SELECT {cols} FROM project_team_members;")
+            associations = cur.fetchall()
+            return associations
     except Exception as e:
         st.error(f"Erro ao obter associações projeto-equipe: {e}")
-        return []
-    finally:
-        cur.close()
+        raise
 
 
 def delete_project_team_member_db(project_id, team_member_id):
-    conn = get_db_connection()
-    if not conn:
-        return {"error": "Sem conexão com o BD."}
-    cur = conn.cursor()
     try:
-        cur.execute(
-            "DELETE FROM project_team_members WHERE project_id = %s AND team_member_id = %s RETURNING project_id, team_member_id;",
-            (project_id, team_member_id),
-        )
-        deleted_ids = cur.fetchone()
-        conn.commit()
-        if deleted_ids:
-            return {
-                "message": "Associação projeto-equipe deletada com sucesso",
-                "project_id": str(deleted_ids[0]),
-                "team_member_id": str(deleted_ids[1]),
-            }
-        return {"error": "Associação projeto-equipe não encontrada."}
+        with db_cursor(autocommit=True) as cur:
+            cur.execute(
+                "DELETE FROM project_team_members WHERE project_id = %s AND team_member_id = %s RETURNING project_id, team_member_id;",
+                (project_id, team_member_id),
+            )
+            deleted_ids = cur.fetchone()
+            if deleted_ids:
+                return {
+                    "message": "Associação projeto-equipe deletada com sucesso",
+                    "project_id": str(deleted_ids[0]),
+                    "team_member_id": str(deleted_ids[1]),
+                }
+            return {"error": "Associação projeto-equipe não encontrada."}
     except Exception as e:
-        conn.rollback()
         return {"error": str(e)}
-    finally:
-        cur.close()
+
+
+# Opções (id, name) das cinco tabelas de referência que os formulários de
+# cadastro usam em selects, num único round-trip em vez de cinco consultas.
+# psycopg2 não expõe múltiplos result sets, então as listas vêm numa única
+# consulta UNION ALL etiquetada pela tabela de origem.
+def get_form_bootstrap_db(cur):
+    cur.execute(
+        """SELECT 'clients' AS kind, id, name FROM clients
+           UNION ALL SELECT 'suppliers', id, name FROM suppliers
+           UNION ALL SELECT 'team_members', id, name FROM team_members
+           UNION ALL SELECT 'units_of_measure', id, name FROM units_of_measure
+           UNION ALL SELECT 'cost_categories', id, name FROM cost_categories
+           ORDER BY 1, 3;"""
+    )
+    options = {
+        "clients": [],
+        "suppliers": [],
+        "team_members": [],
+        "units_of_measure": [],
+        "cost_categories": [],
+    }
+    for kind, id, name in cur.fetchall():
+        options[kind].append({"id": str(id), "name": name})
+    return options
+
+
+# --- Cache de Leituras ---
+# Tabelas de referência (fornecedores, categorias, unidades, clientes, equipe)
+# mudam pouco; st.cache_data evita uma ida ao banco a cada rerun do script.
+# Projetos e serviços mudam com mais frequência, então usam TTL curto.
+# As telas de escrita devem chamar .clear() do getter correspondente para
+# invalidar o cache após add/update/delete.
+#
+# Falhas de leitura NUNCA são memoizadas: st.cache_data não armazena chamadas
+# que levantam exceção, então um erro transitório do banco não fica sendo
+# servido do cache pelo TTL inteiro — o próximo rerun tenta o banco de novo.
+class DBReadError(Exception):
+    """Leitura de banco falhou dentro de um wrapper cacheado."""
+
+
+def _raise_on_error(result):
+    if isinstance(result, dict) and "error" in result:
+        raise DBReadError(result["error"])
+    return result
+
+
+@st.cache_data(ttl=3600)
+def get_suppliers_cached():
+    return _raise_on_error(execute_db_operation(get_suppliers_db))
+
+
+@st.cache_data(ttl=3600)
+def get_cost_categories_cached():
+    return _raise_on_error(execute_db_operation(get_cost_categories_db))
+
+
+@st.cache_data(ttl=3600)
+def get_units_of_measure_cached():
+    return _raise_on_error(execute_db_operation(get_units_of_measure_db))
+
+
+@st.cache_data(ttl=3600)
+def get_clients_cached():
+    return _raise_on_error(execute_db_operation(get_clients_db))
+
+
+@st.cache_data(ttl=3600)
+def get_team_members_cached():
+    return _raise_on_error(execute_db_operation(get_team_members_db))
+
+
+@st.cache_data(ttl=60)
+def get_projects_cached():
+    return _raise_on_error(execute_db_operation(get_projects_db))
+
+
+@st.cache_data(ttl=60)
+def get_project_services_cached(project_id=None):
+    # project_id participa da chave do cache automaticamente
+    return _raise_on_error(execute_db_operation(get_project_services_db, project_id))
+
+
+# Documentos e versões mudam pouco depois de enviados; RDOs e seus filhos
+# recebem escritas ao longo do dia, então ficam com TTL bem curto.
+@st.cache_data(ttl=300)
+def get_project_documents_cached(project_id=None):
+    return get_project_documents_db(project_id)
+
+
+@st.cache_data(ttl=300)
+def get_document_versions_cached(document_id=None):
+    return get_document_versions_db(document_id)
+
+
+@st.cache_data(ttl=60)
+def get_daily_logs_cached(project_id=None):
+    return get_daily_logs_db(project_id)
+
+
+@st.cache_data(ttl=60)
+def get_daily_log_activities_cached(daily_log_id=None):
+    return get_daily_log_activities_db(daily_log_id)
+
+
+@st.cache_data(ttl=60)
+def get_daily_log_costs_cached(daily_log_id=None):
+    return get_daily_log_costs_db(daily_log_id)
+
+
+@st.cache_data(ttl=60)
+def get_daily_log_photos_cached(daily_log_id=None):
+    return get_daily_log_photos_db(daily_log_id)
+
+
+@st.cache_data(ttl=300)
+def get_project_team_members_cached(project_id=None, team_member_id=None):
+    return get_project_team_members_db(project_id, team_member_id)
+
+
+@st.cache_data(ttl=300)
+def get_form_bootstrap_cached():
+    return _raise_on_error(execute_db_operation(get_form_bootstrap_db))
+
+
+# Executor compartilhado para leituras independentes do dashboard: como o
+# ThreadedConnectionPool é thread-safe, cada chamada empresta sua própria
+# conexão e N consultas custam max(latência) em vez de soma(latências).
+@st.cache_resource
+def get_executor():
+    return ThreadPoolExecutor(max_workers=8)
+
+
+def _call_with_ctx(fn, ctx):
+    # Threads do executor nascem sem ScriptRunContext; sem anexá-lo, os
+    # wrappers de st.cache_data rodam sem sessão e qualquer st.error/st.stop
+    # dentro deles se perde ou ressurge como exceção estranha no result().
+    if ctx is not None:
+        add_script_run_ctx(threading.current_thread(), ctx)
+    return fn()
+
+
+def fetch_parallel(calls):
+    """
+    Executa leituras independentes em paralelo. Recebe um dict
+    {nome: callable sem argumentos} e devolve {nome: resultado}; exceções
+    de uma chamada propagam ao coletar o resultado correspondente.
+    O ScriptRunContext do rerun atual é propagado a cada worker.
+    Ex.: fetch_parallel({"projects": get_projects_cached,
+                         "clients": get_clients_cached})
+    """
+    executor = get_executor()
+    ctx = get_script_run_ctx()
+    futures = {
+        name: executor.submit(_call_with_ctx, fn, ctx) for name, fn in calls.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
 
 
 # --- Configurações da Página Streamlit (Continuação) ---
@@ -1467,8 +2351,10 @@ st.set_page_config(
 )
 
 # --- Estilo CSS Personalizado (Baseado no Conceito Visual) ---
-st.markdown(
-    """
+# O blob fica num constante de módulo, construído uma única vez no import.
+# O st.markdown em si precisa rodar a cada rerun (o Streamlit remonta o DOM
+# do frame inteiro), então o que se evita aqui é recriar/concatenar a string.
+_CSS_BLOCK = """
     <style>
     /* Esconde o cabeçalho e rodapé padrão do Streamlit */
     #MainMenu {visibility: hidden;}
@@ -1563,21 +2449,32 @@ st.markdown(
         margin-bottom: 30px;
     }
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+
+
+def inject_css():
+    st.markdown(_CSS_BLOCK, unsafe_allow_html=True)
+
+
+inject_css()
 
 # --- Gerenciamento de Estado da Sessão ---
-if "logged_in" not in st.session_state:
-    st.session_state.logged_in = False
-if "user_info" not in st.session_state:
-    st.session_state.user_info = None
-if "show_register" not in st.session_state:
-    st.session_state.show_register = False
+# Uma única chave "view" (login | register | main) no lugar de flags
+# booleanas independentes: o roteador vira um lookup e não há combinação
+# inconsistente de flags para resetar em logout.
+st.session_state.setdefault("view", "login")
+st.session_state.setdefault("user_info", None)
+
+
+# Moldura comum das telas de autenticação: colunas, container e cabeçalho
+# são idênticos em login e registro; o miolo de cada tela entra como um
+# callable, e o HTML do logo é um constante de módulo.
+_LOGO_HTML = (
+    '<div class="logo-text">Software<span style="color: #333333;">Obras</span></div>'
+)
 
 
-# --- Função para Exibir a Tela de Login ---
-def show_login_page():
+def _render_auth_shell(subtitle, body):
     # Estrutura de duas colunas para o layout da imagem de fundo e formulário
     st.markdown('<div class="main-layout-container">', unsafe_allow_html=True)
     st.markdown(
@@ -1591,124 +2488,115 @@ def show_login_page():
         '<div class="login-container">', unsafe_allow_html=True
     )  # Container do formulário dentro da coluna
 
-    # Substituído o logo SVG pelo nome do sistema
-    st.markdown(
-        '<div class="logo-text">Software<span style="color: #333333;">Obras</span></div>',
-        unsafe_allow_html=True,
-    )
-
+    st.markdown(_LOGO_HTML, unsafe_allow_html=True)
     st.markdown(
-        '<div class="logo-subtitle">Gerenciamento Inteligente de Projetos de Construção</div>',
-        unsafe_allow_html=True,
+        f'<div class="logo-subtitle">{subtitle}</div>', unsafe_allow_html=True
     )
 
     st.write("---")  # Linha divisória
 
-    st.subheader("Login")
-
-    email = st.text_input(
-        "Email", placeholder="seu.email@exemplo.com", key="login_email"
-    )
-    password = st.text_input(
-        "Senha", type="password", placeholder="********", key="login_password"
-    )
-
-    col1, col2 = st.columns(2)
-    with col1:
-        if st.button("Entrar", key="login_button"):
-            if email and password:
-                result = execute_db_operation(login_user_db, email, password)
-                if "user_id" in result:
-                    st.session_state.logged_in = True
-                    st.session_state.user_info = result
-                    st.success(f"Bem-vindo, {result.get('user_name', 'usuário')}!")
-                    st.rerun()
-                else:
-                    st.error(result.get("error", "Erro ao fazer login."))
-            else:
-                st.warning("Por favor, insira email e senha.")
-    with col2:
-        if st.button("Registrar", key="show_register_button"):
-            st.session_state.show_register = True
-            st.rerun()
-
-    st.markdown(
-        '<div style="margin-top: 20px; color: #888888;">Esqueceu sua senha? Clique aqui.</div>',
-        unsafe_allow_html=True,
-    )
+    body()
 
     st.markdown("</div>", unsafe_allow_html=True)  # Fecha login-container
     st.markdown("</div>", unsafe_allow_html=True)  # Fecha login-form-column
     st.markdown("</div>", unsafe_allow_html=True)  # Fecha main-layout-container
 
 
-# --- Função para Exibir a Tela de Registro ---
-def show_register_page():
-    st.markdown('<div class="main-layout-container">', unsafe_allow_html=True)
-    st.markdown(
-        '<div class="image-column"></div>', unsafe_allow_html=True
-    )  # Coluna da imagem
+# --- Função para Exibir a Tela de Login ---
+def _login_body():
+    st.subheader("Login")
 
-    st.markdown(
-        '<div class="login-form-column">', unsafe_allow_html=True
-    )  # Coluna do formulário
-    st.markdown(
-        '<div class="login-container">', unsafe_allow_html=True
-    )  # Container do formulário dentro da coluna
+    # st.form agrupa os campos: o script só reexecuta no submit, e não a
+    # cada tecla digitada nos inputs.
+    with st.form("login_form"):
+        email = st.text_input(
+            "Email", placeholder="seu.email@exemplo.com", key="login_email"
+        )
+        password = st.text_input(
+            "Senha", type="password", placeholder="********", key="login_password"
+        )
+        submitted = st.form_submit_button("Entrar")
+
+    if submitted:
+        if email and password:
+            result = login_user(email, password)
+            if "user_id" in result:
+                st.session_state.view = "main"
+                st.session_state.user_info = result
+                st.success(f"Bem-vindo, {result.get('user_name', 'usuário')}!")
+                st.rerun()
+            else:
+                st.error(result.get("error", "Erro ao fazer login."))
+        else:
+            st.warning("Por favor, insira email e senha.")
+
+    if st.button("Registrar", key="show_register_button"):
+        st.session_state.view = "register"
+        st.rerun()
 
-    # Substituído o logo SVG pelo nome do sistema
     st.markdown(
-        '<div class="logo-text">Software<span style="color: #333333;">Obras</span></div>',
+        '<div style="margin-top: 20px; color: #888888;">Esqueceu sua senha? Clique aqui.</div>',
         unsafe_allow_html=True,
     )
 
-    st.markdown(
-        '<div class="logo-subtitle">Crie sua conta</div>', unsafe_allow_html=True
+
+def show_login_page():
+    _render_auth_shell(
+        "Gerenciamento Inteligente de Projetos de Construção", _login_body
     )
 
-    st.write("---")
 
+# --- Função para Exibir a Tela de Registro ---
+def _register_body():
     st.subheader("Registro")
 
-    name = st.text_input("Nome Completo", key="register_name")
-    email = st.text_input("Email", key="register_email")
-    password = st.text_input("Senha", type="password", key="register_password")
-    confirm_password = st.text_input(
-        "Confirmar Senha", type="password", key="confirm_password"
-    )
+    with st.form("register_form"):
+        name = st.text_input("Nome Completo", key="register_name")
+        email = st.text_input("Email", key="register_email")
+        password = st.text_input("Senha", type="password", key="register_password")
+        confirm_password = st.text_input(
+            "Confirmar Senha", type="password", key="confirm_password"
+        )
+        submitted = st.form_submit_button("Criar Conta")
 
-    if st.button("Criar Conta", key="create_account_button"):
+    if submitted:
         if password != confirm_password:
             st.error("As senhas não coincidem.")
         elif not name or not email or not password:
             st.warning("Por favor, preencha todos os campos.")
+        elif "@" not in email or "." not in email.rsplit("@", 1)[-1]:
+            # Valida o formato antes de gastar um round-trip ao banco e um hash bcrypt
+            st.warning("Por favor, insira um email válido.")
+        elif len(password) < 8:
+            st.warning("A senha deve ter pelo menos 8 caracteres.")
         else:
-            result = execute_db_operation(register_user_db, name, email, password)
+            result = register_user(name, email, password)
             if "id" in result:
                 st.success("Conta criada com sucesso! Você pode fazer login agora.")
-                st.session_state.show_register = False  # Volta para a tela de login
+                st.session_state.view = "login"
                 st.rerun()
             else:
                 st.error(result.get("error", "Erro ao criar conta."))
 
     if st.button("Voltar para Login", key="back_to_login_button"):
-        st.session_state.show_register = False
+        st.session_state.view = "login"
         st.rerun()
 
-    st.markdown("</div>", unsafe_allow_html=True)  # Fecha login-container
-    st.markdown("</div>", unsafe_allow_html=True)  # Fecha login-form-column
-    st.markdown("</div>", unsafe_allow_html=True)  # Fecha main-layout-container
+
+def show_register_page():
+    _render_auth_shell("Crie sua conta", _register_body)
 
 
 # --- Função para Exibir a Página Principal do Aplicativo (Após Login) ---
 def show_main_app_page():
+    user = current_user()
     st.markdown('<div class="main-app-container">', unsafe_allow_html=True)
     st.markdown(
-        f"<h1>Bem-vindo, {st.session_state.user_info.get('user_name', 'Usuário')}!</h1>",
+        f"<h1>Bem-vindo, {user.get('user_name', 'Usuário')}!</h1>",
         unsafe_allow_html=True,
     )
     st.markdown(
-        f"<p>Seu nível de acesso: <strong>{st.session_state.user_info.get('user_role', 'Não definido')}</strong></p>",
+        f"<p>Seu nível de acesso: <strong>{user.get('user_role', 'Não definido')}</strong></p>",
         unsafe_allow_html=True,
     )
     st.write(
@@ -1717,11 +2605,8 @@ def show_main_app_page():
     st.write("Em breve, integraremos os dados do seu back-end aqui!")
 
     if st.button("Sair", key="logout_button"):
-        st.session_state.logged_in = False
+        st.session_state.view = "login"
         st.session_state.user_info = None
-        st.session_state.show_register = (
-            False  # Resetar para garantir que vai para login
-        )
         st.rerun()
 
     st.subheader("Funcionalidades Disponíveis (Esqueleto)")
@@ -1735,9 +2620,9 @@ def show_main_app_page():
 
 
 # --- Lógica Principal do Aplicativo ---
-if st.session_state.logged_in:
-    show_main_app_page()
-elif st.session_state.show_register:
-    show_register_page()
-else:
-    show_login_page()
+_VIEWS = {
+    "login": show_login_page,
+    "register": show_register_page,
+    "main": show_main_app_page,
+}
+_VIEWS[st.session_state.view]()